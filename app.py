@@ -1,9 +1,24 @@
 import os
 import time
 import tempfile
+import importlib
+import pandas as pd
 import streamlit as st
-from streamlit_pages import kspace_timing_map, select_raw_data, pmu, kspace_recovery_durations, pmu_stats, longitudinal_magnetizations
-import PIL.Image as Image
+from utils import profiling
+
+# Pages are imported on first use so that only the dependencies of the selected page are loaded
+PAGES = {
+    "Choose raw data": ("streamlit_pages.select_raw_data", "select_raw_data"),
+    "Acquisition Timeline": ("streamlit_pages.kspace_timing_map", "kspace_timing_map"),
+    "Physiological Data": ("streamlit_pages.pmu", "pmu"),
+    "Physiological Statistics": ("streamlit_pages.pmu_stats", "pmu_stats"),
+    "Recovery Durations": ("streamlit_pages.kspace_recovery_durations", "kspace_recovery_durations"),
+    "Longitudinal Magnetizations": ("streamlit_pages.longitudinal_magnetizations", "longitudinal_magnetizations"),
+    "Gating Efficiency": ("streamlit_pages.gating_efficiency", "gating_efficiency"),
+}
+
+# JSON lines file where the profile of every run is appended, disabled if empty
+PROFILE_LOG_PATH = os.environ.get("SHOWTWIX_PROFILE_LOG")
 
 def cleanup_old_temp_files(age=3600):
     now = time.time()
@@ -14,21 +29,46 @@ def cleanup_old_temp_files(age=3600):
                 try: os.remove(path)
                 except: pass
 
+def get_page(name):
+    module_name, func_name = PAGES[name]
+    return getattr(importlib.import_module(module_name), func_name)
+
+def debug_panel(run):
+    with st.sidebar.expander("Debug: profiling"):
+        st.write(f"Run '{run.name}': {run.duration:.0f} ms")
+        if run.peak_memory is not None:
+            st.write(f"Process peak RSS since startup: {run.peak_memory:.0f} MB")
+        if run.spans:
+            spans = pd.DataFrame(run.spans)
+            spans['name'] = ['    '*depth + name for depth, name in zip(spans.depth, spans.name)]
+            st.dataframe(spans.drop(columns='depth'), hide_index=True)
+        if run.figures:
+            st.dataframe(pd.DataFrame(run.figures), hide_index=True)
+        if st.button("Profile next rerun"):
+            st.session_state.profile_next_rerun = True
+            st.rerun()
+        if st.session_state.get('cprofile_stats'):
+            st.text(st.session_state.cprofile_stats)
+
 if __name__=="__main__":
-    cleanup_old_temp_files()
-    page_names_to_funcs = {
-    "Choose raw data": select_raw_data.select_raw_data,
-    "Acquisition Timeline": kspace_timing_map.kspace_timing_map,
-    "Physiological Data": pmu.pmu,
-    "Physiological Statistics": pmu_stats.pmu_stats,
-    "Recovery Durations": kspace_recovery_durations.kspace_recovery_durations,
-    "Longitudinal Magnetizations": longitudinal_magnetizations.longitudinal_magnetizations,
-    }
-    selected_page = st.sidebar.selectbox("Go to page", page_names_to_funcs.keys())
-    page_names_to_funcs[selected_page]()
+    if 'temp_files_cleaned' not in st.session_state: # once per session rather than on every rerun
+        cleanup_old_temp_files()
+        st.session_state.temp_files_cleaned = True
+    selected_page = st.sidebar.selectbox("Go to page", PAGES.keys())
+    cprofile = st.session_state.pop('profile_next_rerun', False)
+    with profiling.profile_run(
+        selected_page, log_path=PROFILE_LOG_PATH, cprofile=cprofile, trace_memory=cprofile,
+    ) as run:
+        with profiling.span(f"import: {selected_page}"):
+            page = get_page(selected_page)
+        with profiling.span(f"page: {selected_page}"):
+            page()
+    if run.cprofile_stats is not None:
+        st.session_state.cprofile_stats = run.cprofile_stats
 
     if 'image_buffer' in st.session_state and st.session_state.image_buffer is not None:
-        # Load image from buffer and display
-        img = Image.open(st.session_state['image_buffer'])
+        # the buffer holds encoded image bytes, displayed without decoding them
         with st.sidebar:
-            st.image(img, caption="Saved Image")
\ No newline at end of file
+            st.image(st.session_state.image_buffer, caption="Saved Image")
+
+    debug_panel(run)
@@ -0,0 +1,96 @@
+"""Compare the solvers of the correction pulse of find_1_optimal_pulse.
+
+For a set of RR deviations of the shot before a corrupted shot, the correction pulse is found with
+differential evolution and with the gradient solver. Differential evolution is timed twice: on the original
+objective, which loops over the T1s in Python and recomputes the steady states at each evaluation as
+find_1_optimal_pulse did before the gradient solver, and on the vectorised correction_pulse_objective now
+used by the 'differential_evolution' solver. The script reports the time of each solver, their objective
+values and the difference of the pulses found by the vectorised differential evolution and the gradient solver.
+
+Usage:
+    python benchmarks/correction_pulse.py [--TI 0.4] [--RR 1.0]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.optimized_pulse import (
+    compute_Mzeq_with_SPRESS, compute_relaxation, correction_pulse_objective, solve_correction_pulse,
+)
+
+def solve_baseline(TI, RR, TR, Nseg, deviation, T1s, maxiter=1000):
+    """Differential evolution on the original objective of find_1_optimal_pulse, looping over the T1s."""
+    from scipy.optimize import differential_evolution
+    def objective(params):
+        t_a, alpha_b = params
+        total_error = 0
+        cos_b = np.cos(alpha_b)
+        for T1 in T1s:
+            Mzeq = compute_Mzeq_with_SPRESS(TI, T1, RR, TR, Nseg)
+            M_corrupted = compute_relaxation(Mzeq, deviation, T1)
+            M = compute_relaxation(-M_corrupted, TI-t_a, T1)
+            M *= cos_b
+            M = compute_relaxation(M, t_a, T1)
+            S_eq = compute_relaxation(-Mzeq, TI, T1)
+            total_error += (M-S_eq)**2
+        return total_error
+    return tuple(differential_evolution(objective, bounds=[(0, TI), (0, np.pi)], maxiter=maxiter).x)
+
+def solve_differential_evolution(M_corrupted, S_eq, TI, T1s, maxiter=1000):
+    from scipy.optimize import differential_evolution
+    objective = lambda params: correction_pulse_objective(params, M_corrupted, S_eq, TI, T1s)[0]
+    return tuple(differential_evolution(objective, bounds=[(0, TI), (0, np.pi)], maxiter=maxiter).x)
+
+def timed(solver, *args):
+    start = time.perf_counter()
+    pulse = solver(*args)
+    return pulse, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--TI", type=float, default=0.4, help="inversion time in seconds")
+    parser.add_argument("--RR", type=float, default=1.0, help="regular RR interval in seconds")
+    parser.add_argument("--TR", type=float, default=5e-3, help="repetition time in seconds")
+    parser.add_argument("--Nseg", type=int, default=30, help="number of segments")
+    args = parser.parse_args()
+
+    T1s = 1e-3*np.arange(250, 1500, 100)
+    Mzeq = compute_Mzeq_with_SPRESS(args.TI, T1s, args.RR, args.TR, args.Nseg)
+    S_eq = compute_relaxation(-Mzeq, args.TI, T1s)
+    deviations = np.array([-0.3, -0.2, -0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1., 1.5, 2., 3.])
+
+    print(f"{'RR deviation (s)':>16s} {'base (ms)':>9s} {'DE (ms)':>9s} {'grad (ms)':>9s} {'speedup':>8s} "
+          f"{'base error':>10s} {'DE error':>10s} {'grad error':>10s} {'|dt_a| (ms)':>11s} {'|dalpha| (°)':>12s}")
+    # warm up the scipy imports so that they are not timed with the first deviation
+    M_corrupted = compute_relaxation(Mzeq, deviations[0], T1s)
+    solve_differential_evolution(M_corrupted, S_eq, args.TI, T1s, maxiter=1)
+    solve_correction_pulse(M_corrupted, S_eq, args.TI, T1s)
+    total_baseline, total_de, total_gradient = 0, 0, 0
+    for deviation in deviations:
+        M_corrupted = compute_relaxation(Mzeq, deviation, T1s)
+        problem = (M_corrupted, S_eq, args.TI, T1s)
+        pulse_baseline, time_baseline = timed(
+            solve_baseline, args.TI, args.RR, args.TR, args.Nseg, deviation, T1s,
+        )
+        pulse_de, time_de = timed(solve_differential_evolution, *problem)
+        pulse_gradient, time_gradient = timed(solve_correction_pulse, *problem)
+        total_baseline += time_baseline
+        total_de += time_de
+        total_gradient += time_gradient
+        error_baseline = correction_pulse_objective(pulse_baseline, *problem)[0]
+        error_de = correction_pulse_objective(pulse_de, *problem)[0]
+        error_gradient = correction_pulse_objective(pulse_gradient, *problem)[0]
+        print(f"{deviation:16.2f} {time_baseline*1e3:9.1f} {time_de*1e3:9.1f} {time_gradient*1e3:9.1f} "
+              f"{time_baseline/time_gradient:8.0f} {error_baseline:10.2e} {error_de:10.2e} {error_gradient:10.2e} "
+              f"{abs(pulse_de[0]-pulse_gradient[0])*1e3:11.2f} {np.rad2deg(abs(pulse_de[1]-pulse_gradient[1])):12.2f}")
+    print(f"total: original differential evolution {total_baseline:.2f} s, "
+          f"vectorised differential evolution {total_de:.2f} s, gradient {total_gradient:.3f} s, "
+          f"speedup {total_baseline/total_gradient:.0f}x over the original and {total_de/total_gradient:.0f}x "
+          f"over the vectorised differential evolution")
+
+if __name__ == "__main__":
+    main()
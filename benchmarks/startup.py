@@ -0,0 +1,56 @@
+"""Measure the import time of the app modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime` so that the cold-start cost,
+including the third-party dependencies it pulls in, is measured independently of the other modules.
+
+Usage:
+    python benchmarks/startup.py [--repeat 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = [
+    "streamlit",
+    "utils.profiling",
+    "utils.twix_dataframe",
+    "utils.optimized_pulse",
+    "utils.sweep",
+    "streamlit_pages.select_raw_data",
+    "streamlit_pages.kspace_timing_map",
+    "streamlit_pages.pmu",
+    "streamlit_pages.pmu_stats",
+    "streamlit_pages.kspace_recovery_durations",
+    "streamlit_pages.longitudinal_magnetizations",
+    "recotwix",
+]
+
+def import_time(module):
+    """Cumulative import time of a module in microseconds, None if it cannot be imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="number of measurements per module, the best is kept")
+    args = parser.parse_args()
+    print(f"{'module':45s} {'import time (ms)':>16s}")
+    for module in MODULES:
+        times = [import_time(module) for _ in range(args.repeat)]
+        times = [t for t in times if t is not None]
+        print(f"{module:45s} {min(times)/1e3:16.1f}" if times else f"{module:45s} {'not importable':>16s}")
+
+if __name__ == "__main__":
+    main()
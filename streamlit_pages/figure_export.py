@@ -0,0 +1,54 @@
+import streamlit as st
+
+from utils.figure_rendering import get_renderer, MIME_TYPES
+
+def figure_export(fig, name, inputs, formats=('png', 'svg')):
+    """Buttons to render a figure to images, download them and show the PNG in the sidebar.
+
+    The images are rendered in the threads of the shared renderer, without blocking the script: until they are
+    ready a fragment polls the renderer every second. They are cached by file content and figure inputs, so reruns
+    and other sessions with the same file and inputs serve the cached bytes.
+
+    Args:
+        fig (go.Figure): figure to export.
+        name (str): name of the figure, used as file name.
+        inputs (tuple): hashable description of the settings the figure depends on, besides the file.
+        formats (tuple, optional): image formats. Defaults to ('png', 'svg').
+    """
+    inputs = (st.session_state.get('file_digest'), name) + tuple(inputs)
+    if 'figure_exports' not in st.session_state:
+        st.session_state.figure_exports = {}
+    if st.button("🖼️ Render images", key=f"render_{name}"):
+        renderer = get_renderer()
+        st.session_state.figure_exports[name] = (
+            inputs, {format: renderer.submit(fig, format, inputs=inputs) for format in formats},
+        )
+    if name not in st.session_state.figure_exports or st.session_state.figure_exports[name][0] != inputs:
+        return
+    _, futures = st.session_state.figure_exports[name]
+    polling = not all(future.done() for future in futures.values())
+    st.fragment(download_buttons, run_every=1. if polling else None)(name, futures, polling)
+
+def download_buttons(name, futures, polling):
+    if not all(future.done() for future in futures.values()):
+        st.caption("⏳ Rendering images...")
+        return
+    if polling:
+        st.rerun() # rerun the whole script to stop polling
+    try:
+        images = {format: future.result() for format, future in futures.items()}
+    except Exception as e:
+        st.warning(f"Failed to render the figure (is kaleido installed?): {e}")
+        return
+    columns = st.columns(len(images) + 1)
+    for column, (format, image) in zip(columns, images.items()):
+        column.download_button(
+            label=f"📥 Download {format.upper()}",
+            data=image,
+            file_name=f"{name}.{format}",
+            mime=MIME_TYPES[format],
+            key=f"download_{name}_{format}",
+        )
+    if 'png' in images and columns[-1].button("Show in sidebar", key=f"sidebar_{name}"):
+        st.session_state.image_buffer = images['png']
+        st.rerun() # the sidebar is drawn outside of the fragment
@@ -0,0 +1,88 @@
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+
+from utils import profiling
+from utils.gating import compute_shot_gating, compute_efficiency, summarize_gating
+from utils.optimized_pulse import adaptive_resolution
+from utils.twix_dataframe import get_navigator_times, get_navigator_timestamps, get_start_time
+
+def plot_efficiency(efficiency, pmu_summary=None, resp_key=None, start_time=None):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=efficiency.Time, y=efficiency.Efficiency, mode='lines+markers', name='Efficiency',
+    ))
+    fig.add_trace(go.Scatter(
+        x=efficiency.Time, y=efficiency['Cumulative efficiency'], mode='lines', name='Cumulative efficiency',
+    ))
+    if resp_key is not None:
+        # RESP time axis starts at its first sample, shift it to the time origin of the line table
+        offset = (pmu_summary.start_timestamps[resp_key] - int(start_time)) * 2.5e-3
+        times, signal = adaptive_resolution(
+            pmu_summary.times[resp_key] + offset, pmu_summary.signals[resp_key], max_points=20000,
+        )
+        fig.add_trace(go.Scatter(
+            x=times, y=signal, mode='lines', name=resp_key, yaxis='y2', line=dict(color='gray', width=1),
+        ))
+    fig.update_layout(
+        xaxis=dict(title='Time (seconds)'),
+        yaxis=dict(title='Gating efficiency', range=[0, 1.05]),
+        yaxis2=dict(title='Normalized respiratory signal', overlaying='y', side='right', showgrid=False),
+        legend=dict(title='Legend'),
+        height=600,
+        margin=dict(t=40, b=40),
+        template='simple_white'
+    )
+    return fig
+
+def gating_efficiency():
+    st.header("Gating Efficiency")
+    if 'df' not in st.session_state or 'twix' not in st.session_state:
+        st.error("❗ Please upload a raw data file  first.")
+        return
+
+    df = st.session_state.df
+    # raw timestamps are cached as the time origin of the line table changes with the trigger method
+    if st.session_state.get('navigator_timestamps') is None:
+        with profiling.span("get_navigator_timestamps"):
+            st.session_state.navigator_timestamps = get_navigator_timestamps(st.session_state.twix)
+    shot_starts = get_navigator_times(
+        st.session_state.twix, df.attrs['start_time'], timestamps=st.session_state.navigator_timestamps,
+    )
+    if len(shot_starts):
+        st.write(f"{len(shot_starts)} navigator readouts found, each starts a shot.")
+    elif st.session_state.shot_indexes:
+        trigger_method = st.session_state.get('trigger_method')
+        if trigger_method not in st.session_state.shot_indexes:
+            trigger_method = next(iter(st.session_state.shot_indexes))
+        # trigger times start at the first trigger of their method, shift them to the time origin of the line table
+        offset = (int(get_start_time(st.session_state.twix, trigger_method)) - int(df.attrs['start_time'])) * 2.5e-3
+        shot_starts = st.session_state.shot_indexes[trigger_method].trigger_times + offset
+        st.info(f"No navigator readout found, shots start at the '{trigger_method}' triggers.")
+    else:
+        st.error("❗ No navigator readouts or triggers found to define the shots.")
+        return
+
+    bin_duration = st.sidebar.slider("Efficiency time bin (s)", 5, 120, 30, step=5)
+    with profiling.span("gating analysis"):
+        shots = compute_shot_gating(df, shot_starts)
+        efficiency = compute_efficiency(shots, bin_duration=bin_duration)
+        summary = summarize_gating(shots)
+    st.dataframe(pd.DataFrame([summary]), hide_index=True)
+
+    pmu_summary = st.session_state.get('pmu_summary')
+    resp_keys = [] if pmu_summary is None else [key for key in pmu_summary.signal_keys if key.startswith('RESP')]
+    resp_key = st.sidebar.selectbox("Respiratory signal", resp_keys) if resp_keys else None
+
+    with profiling.span("figure construction"):
+        fig = plot_efficiency(efficiency, pmu_summary, resp_key, start_time=df.attrs['start_time'])
+    profiling.record_figure("Gating efficiency", fig)
+    with profiling.span("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.download_button(
+        label="📥 Download shot accept/reject table",
+        data=shots.to_csv(index=False),
+        file_name="shot_gating.csv",
+        mime="text/csv"
+    )
@@ -4,13 +4,16 @@ import plotly.graph_objects as go
 import numpy as np
 import pandas as pd
 
-from utils.twix_dataframe import build_line_dataframe, get_trigger_timing
+from streamlit_pages.figure_export import figure_export
+from utils import profiling
+from utils.twix_dataframe import update_trigger_method
 
 def udpate_trigger_method():
-    st.session_state.df = build_line_dataframe(
-        st.session_state.twix, 
+    st.session_state.df = update_trigger_method(
+        st.session_state.df,
+        st.session_state.twix,
         trigger_method=st.session_state.trigger_method,
-        include_patrefscan=not st.session_state.recotwix.prot.isRefScanSeparate,
+        shot_index_cache=st.session_state.shot_indexes,
     )
 
 def plot_fig(df, marker_size, is3D, show_flags, cmin, cmax):
@@ -69,15 +72,9 @@ def kspace_recovery_durations():
         return
     
     # Choose trigger method
-    pmu_data = twix['pmu']
-    default_keys = [
-        key for key in pmu_data.signal 
-        if not key.startswith('LEARN_') 
-        and np.ptp(pmu_data.signal[key])>0
-    ]
     selected = st.selectbox(
         "Choose a trigger method:", 
-        default_keys,
+        st.session_state.pmu_summary.signal_keys,
         key='trigger_method',
         on_change=udpate_trigger_method
     )
@@ -101,12 +98,16 @@ def kspace_recovery_durations():
         cmin, cmax = None, None
 
 
-    fig = plot_fig(df, marker_size, is3D, show_flags, cmin, cmax)
-    st.plotly_chart(fig, use_container_width=True)
+    with profiling.span("figure construction"):
+        fig = plot_fig(df, marker_size, is3D, show_flags, cmin, cmax)
+    profiling.record_figure("Recovery durations map", fig)
+    with profiling.span("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+    figure_export(fig, "recovery_durations_map", (selected, len(df), marker_size, show_flags, cmin, cmax))
 
     # Download RD button
     with io.StringIO() as buffer:
-        list_RRs = np.diff(get_trigger_timing(twix, selected))  # Ensure trigger timing is calculated
+        list_RRs = st.session_state.shot_indexes[selected].RRs
         rr_series = pd.Series(list_RRs, name="RR_intervals")
         rr_series.to_csv(buffer, index=False, header=True)
         st.download_button(
@@ -3,6 +3,10 @@ import time
 import plotly.graph_objects as go
 import numpy as np
 
+from streamlit_pages.figure_export import figure_export
+from utils import profiling
+from utils.kspace_coverage import get_kspace_center, compute_kspace_coverage
+
 def plot_fig(df, marker_size, is3D, show_flags):
     y = df.Par if is3D else df.Sli
     ylabel = 'Partition' if is3D else 'Slice'
@@ -51,5 +55,36 @@ def kspace_timing_map():
     marker_size = st.sidebar.slider("Marker Size", 2, 10, 6)
     show_flags = st.sidebar.checkbox("Show Flags", value=False)
 
-    fig = plot_fig(df, marker_size, is3D, show_flags)
-    st.plotly_chart(fig, use_container_width=True)
+    with profiling.span("figure construction"):
+        fig = plot_fig(df, marker_size, is3D, show_flags)
+    profiling.record_figure("K-space timing map", fig)
+    with profiling.span("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+    figure_export(fig, "kspace_timing_map", (len(df), marker_size, is3D, show_flags))
+
+    kspace_coverage(df, twix)
+
+
+def kspace_coverage(df, twix):
+    st.subheader("K-Space Coverage")
+    n_bands = st.sidebar.slider("Number of radial bands", 2, 30, 10)
+    center_radius = st.sidebar.slider("K-space center radius (normalised)", 0.01, 0.5, 0.1, step=0.01)
+
+    # computed once per file and settings
+    if st.session_state.get('kspace_coverage') is None:
+        st.session_state.kspace_coverage = {}
+    key = (st.session_state.get('trigger_method'), 'RD' in df.columns, n_bands, center_radius)
+    if key not in st.session_state.kspace_coverage:
+        with profiling.span("compute_kspace_coverage"):
+            center_lin, center_par = get_kspace_center(twix, df)
+            st.session_state.kspace_coverage[key] = compute_kspace_coverage(
+                df, center_lin, center_par, n_bands=n_bands, center_radius=center_radius,
+            )
+    bands, slices, center = st.session_state.kspace_coverage[key]
+
+    st.write("Acquisition time per radial distance band (0 is the k-space center):")
+    st.dataframe(bands, hide_index=True)
+    st.write("K-space center per slice:")
+    st.dataframe(slices, hide_index=True)
+    st.write("Recovery durations during the k-space center:")
+    st.dataframe([center], hide_index=True)
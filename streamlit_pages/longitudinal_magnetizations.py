@@ -8,9 +8,10 @@ import numpy as np
 import plotly.graph_objs as go
 import pandas as pd
 
-from streamlit_pages import pmu
-from utils.twix_dataframe import build_line_dataframe
+from utils import profiling
+from utils.twix_dataframe import update_trigger_method
 from utils.optimized_pulse import series_Mz_1FA_SPPRESS, find_corrupted_shot, find_1_optimal_pulse
+from utils.sweep import run_sweep, CORRECTION_METHODS
 
 
 ###############
@@ -19,10 +20,11 @@ from utils.optimized_pulse import series_Mz_1FA_SPPRESS, find_corrupted_shot, fi
 
 
 def udpate_trigger_method():
-    st.session_state.df = build_line_dataframe(
-        st.session_state.twix, 
+    st.session_state.df = update_trigger_method(
+        st.session_state.df,
+        st.session_state.twix,
         trigger_method=st.session_state.trigger_method,
-        include_patrefscan=not st.session_state.recotwix.prot.isRefScanSeparate,
+        shot_index_cache=st.session_state.shot_indexes,
     )
 
 def convert_timestamp_seconds(timestamp, starttime=None):
@@ -88,26 +90,19 @@ def longitudinal_magnetizations():
     
     TI = twix['hdr']['Meas']['alTI'][0]*1e-6  # convert to seconds
     # Choose trigger method
-    pmu_data = twix['pmu']
-    default_keys = [
-        key for key in pmu_data.signal 
-        if not key.startswith('LEARN_') 
-        and np.any(pmu_data.trigger[key])
-    ]
     trigger_selected = st.selectbox(
         "Choose a trigger method:", 
-        default_keys,
+        st.session_state.pmu_summary.trigger_keys,
         key='trigger_method',
         on_change=udpate_trigger_method
     )
     udpate_trigger_method()  # Ensure the DataFrame is updated with the selected trigger method
         
-    mask = twix['pmu'].trigger[trigger_selected]>0
-    trigger_times = twix['pmu'].timestamp_trigger[trigger_selected][mask]
-    trigger_times = (trigger_times - twix['pmu'].timestamp_trigger[trigger_selected][0])*2.5e-3 # convert to seconds
+    df = st.session_state.df
+    shot_index = st.session_state.shot_indexes[trigger_selected]
     readout_times = df.Time.values
-    trigger_to_inversion_duration = min([readout_times[0]-t for t in trigger_times if t<readout_times[0]])-TI
-    trigger_times += trigger_to_inversion_duration
+    trigger_to_inversion_duration = shot_index.time_since_trigger[0]-TI
+    trigger_times = shot_index.trigger_times + trigger_to_inversion_duration
     
     default_flip_angle = twix['hdr']['Meas']['adFlipAngleDegree'][0]
         
@@ -126,7 +121,13 @@ def longitudinal_magnetizations():
         all_t_a_opt = st.slider("t_a (seconds)", 0.0, TI, 0.1, step=0.001)
         all_alpha_b_opt = st.slider("alpha_b (degrees)", 0.0, 180.0, 90.0, step=1.0)
     elif "One optimized pulse" in correction_method:
-        all_t_a_opt, all_alpha_b_opt = find_1_optimal_pulse(trigger_times, readout_times, TI)
+        solver = st.selectbox(
+            "Pulse optimizer",
+            ['gradient', 'differential_evolution'],
+            format_func=lambda solver: {'gradient': "Gradient (fast)", 'differential_evolution': "Differential evolution"}[solver],
+        )
+        with profiling.span("find_1_optimal_pulse"):
+            all_t_a_opt, all_alpha_b_opt = find_1_optimal_pulse(trigger_times, readout_times, TI, solver=solver)
     else:
         all_t_a_opt, all_alpha_b_opt = None, None
 
@@ -135,6 +136,15 @@ def longitudinal_magnetizations():
         st.session_state.T1_dict = {}
 
     T1_species_list()
+
+    adaptive = st.sidebar.checkbox("Adaptive plot resolution", value=True)
+    max_points = st.sidebar.number_input(
+        "Max points per trace (0 for no limit)",
+        min_value=0,
+        value=5000, # first, last, min and max of ~1250 buckets, about 4 samples per pixel of a full width plot
+        step=1000,
+        disabled=not adaptive,
+    )
     
     # Button to trigger plotting
     if len(st.session_state.T1_dict) >= 1:
@@ -149,11 +159,60 @@ def longitudinal_magnetizations():
                 reordering=reordering,
                 t_a=all_t_a_opt,
                 alpha_b=all_alpha_b_opt,
+                adaptive=adaptive,
+                max_points=max_points or None,
             ) # convert T1s to seconds
+        parameter_sweep(shot_index.trigger_times, readout_times, TI, flip_angle, do_SPPRESS, reordering)
     else:
         st.warning("Please add at least one species to plot.")
 
 
+def parameter_sweep(trigger_times, readout_times, TI, FA, do_SPPRESS=True, reordering='Centric'):
+    """Sweep flip angles, inversion times and correction methods over the T1 species of the session.
+
+    Args:
+        trigger_times (np.array): trigger times in seconds (not shifted to the inversion pulses).
+        readout_times (np.array): readout times in seconds.
+        TI (float): default inversion time in seconds.
+        FA (float): default flip angle in degrees.
+        do_SPPRESS (bool, optional): whether to do SPPRESS. Defaults to True.
+        reordering (str, optional): reordering scheme. Defaults to 'Centric'.
+    """
+    with st.expander("Parameter sweep"):
+        with st.form(key="sweep_form"):
+            FAs_input = st.text_input("Flip angles in degrees (comma separated)", f"{FA:g}")
+            TIs_input = st.text_input("Inversion times in seconds (comma separated)", f"{TI:g}")
+            correction_methods = st.multiselect("Correction methods", CORRECTION_METHODS, default=CORRECTION_METHODS)
+            submit_button = st.form_submit_button("Run sweep")
+        if not submit_button:
+            return
+        try:
+            FAs = [float(num.strip()) for num in FAs_input.split(',')]
+            TIs = [float(num.strip()) for num in TIs_input.split(',')]
+        except ValueError:
+            st.warning("Please enter valid numbers for flip angles and inversion times.")
+            return
+        if 'sweep_cache' not in st.session_state:
+            st.session_state.sweep_cache = {}
+        with st.spinner("Running sweep..."):
+            with profiling.span("run_sweep"):
+                df_sweep, df_summary = run_sweep(
+                    trigger_times,
+                    readout_times,
+                    TIs,
+                    FAs,
+                    list(st.session_state.T1_dict.values()),
+                    correction_methods=correction_methods,
+                    reordering=reordering,
+                    do_SPPRESS=do_SPPRESS,
+                    cache=st.session_state.sweep_cache,
+                )
+        st.subheader("Configurations ranked by center-shot Mz stability")
+        st.dataframe(df_summary)
+        st.subheader("Results per T1")
+        st.dataframe(df_sweep)
+
+
 def plot_magnetization(
     trigger_times, 
     readout_times, 
@@ -164,6 +223,8 @@ def plot_magnetization(
     reordering='Centric', 
     t_a=0, 
     alpha_b=0,
+    adaptive=False,
+    max_points=None,
 ):
     """plot the magnetization from trigger and readout timings.
 
@@ -177,6 +238,8 @@ def plot_magnetization(
         reordering (str, optional): reordering scheme. Defaults to 'Centric'.
         t_a (float, optional): delay of the optimized block pre readout in seconds. Defaults to 0.
         alpha_b (float, optional): alpha_b pulse angle in degrees. Defaults to 0.
+        adaptive (bool, optional): plot only the samples needed to draw each magnetization. Defaults to False.
+        max_points (int, optional): maximum number of points per magnetization trace if adaptive. Defaults to None.
     """
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=readout_times, y=[0]*len(readout_times), mode='markers', name='Readout Times'))
@@ -186,18 +249,22 @@ def plot_magnetization(
     else:
         corrupted_shots = []
     for name_T1, T1 in T1_dict.items():
-        all_times, all_Mz, all_times_center, all_Mz_center = series_Mz_1FA_SPPRESS(
-            TI, 
-            T1, 
-            FA, 
-            readout_times, 
-            trigger_times,
-            corrupted_shots=np.where(corrupted_shots)[0], 
-            t_a=t_a,
-            alpha_b=alpha_b,
-            do_SPPRESS=do_SPPRESS, 
-            reordering=reordering,
-        )
+        with profiling.span(f"series_Mz_1FA_SPPRESS {name_T1}"):
+            all_times, all_Mz, all_times_center, all_Mz_center = series_Mz_1FA_SPPRESS(
+                TI, 
+                T1, 
+                FA, 
+                readout_times, 
+                trigger_times,
+                corrupted_shots=np.where(corrupted_shots)[0], 
+                t_a=t_a,
+                alpha_b=alpha_b,
+                do_SPPRESS=do_SPPRESS, 
+                reordering=reordering,
+                preallocate=True,
+                adaptive=adaptive,
+                max_points=max_points,
+            )
         fig.add_trace(go.Scatter(x=all_times, y=all_Mz, mode='lines', name=f'Magnetization {name_T1}, T1={T1} s'))
         fig.add_trace(go.Scatter(x=all_times_center, y=all_Mz_center, mode='markers', name=f'Center Shot {name_T1}, T1={T1} s'))
         
@@ -209,6 +276,8 @@ def plot_magnetization(
         margin=dict(t=40, b=40),
         template='simple_white'
     )
-    st.plotly_chart(fig, use_container_width=True)
+    profiling.record_figure("Longitudinal magnetizations", fig)
+    with profiling.span("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
     
 
@@ -1,41 +1,36 @@
 import streamlit as st
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px  # For color palette
+from plotly.colors import qualitative  # For color palette
 
-def convert_timestamp_seconds(timestamp, starttime=None):
-    if starttime is not None:
-        timestamp = timestamp - starttime
-    return timestamp * 2.5e-3  # convert to seconds
+from utils import profiling
+from utils.pmu_summary import PMUSummary
+from utils.trigger_detection import DETECTION_PARAMETERS, add_detected_triggers, compare_triggers
 
-def plot_signals_streamlit(pmu, keys=None, show_trigger=True):
+def plot_signals_streamlit(pmu_summary, keys=None, show_trigger=True):
     fig = go.Figure()
     colors = {}
     trig_keys = []
-    palette = px.colors.qualitative.Dark24
+    palette = qualitative.Dark24
         
     # default keys
     if keys is None or len(keys) == 0:
-        keys = [
-            key for key in pmu.signal 
-            if not key.startswith('LEARN_') 
-            and np.ptp(pmu.signal[key])>0
-        ]
+        keys = pmu_summary.signal_keys
     
     # Assign colors to keys
     for i, key in enumerate(keys):
         colors[key] = palette[i]
         
     for key in keys:
-        y_normalized = (pmu.signal[key] - pmu.signal[key].min())/(pmu.signal[key].max() - pmu.signal[key].min()+1e-8)
         fig.add_trace(go.Scatter(
-            x=convert_timestamp_seconds(pmu.timestamp[key], starttime=pmu.timestamp[key][0]),
-            y=y_normalized,
+            x=pmu_summary.times[key],
+            y=pmu_summary.signals[key],
             mode='lines',
             name=key,
             line=dict(color=colors[key])
         ))
-        if show_trigger and np.any(pmu.trigger[key]):
+        if show_trigger and pmu_summary.has_trigger[key]:
             trig_keys.append(key)
 
     fig.update_layout(
@@ -52,23 +47,23 @@ def plot_signals_streamlit(pmu, keys=None, show_trigger=True):
     # Optional: add trigger eventplot
     if show_trigger and trig_keys:
         for key in trig_keys:
-            trigger_times = convert_timestamp_seconds(
-                pmu.timestamp_trigger[key][pmu.trigger[key] > 0], starttime=pmu.timestamp[key][0]
-            )
+            trigger_times = pmu_summary.trigger_times[key]
             bg_color = fig.layout.plot_bgcolor  # Get the background color of the plot
             # Choose the line color based on the background color (light or dark theme)
             line_color = 'black' if bg_color in ['white', 'lightgray', 'rgba(255, 255, 255, 0)'] else 'white'
-            for t in trigger_times:
-                fig.add_trace(go.Scatter(
-                    x=[t, t],
-                    y=[0, 1],
-                    mode='lines',
-                    line=dict(color=line_color, width=2),
-                    showlegend=False,
-                ))
+            # one trace per channel, vertical segments separated by gaps
+            fig.add_trace(go.Scatter(
+                x=np.column_stack([trigger_times, trigger_times, np.full(len(trigger_times), np.nan)]).ravel(),
+                y=np.tile([0., 1., np.nan], len(trigger_times)),
+                mode='lines',
+                line=dict(color=line_color, width=2),
+                showlegend=False,
+            ))
         fig.update_yaxes(range=[-0.2, 1.1], title='Normalized signal (with triggers)')
 
-    st.plotly_chart(fig, use_container_width=True)
+    profiling.record_figure("PMU signals", fig)
+    with profiling.span("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
 
 
 def pmu():
@@ -77,14 +72,40 @@ def pmu():
         st.error("❗ Please upload a raw data file  first.")
         return
 
-    pmu_data = st.session_state.twix['pmu']
+    pmu_summary = st.session_state.pmu_summary
+    if pmu_summary is None:
+        st.error("❗ No PMU data found in the Twix file. \
+            Please ensure the raw data contains physiological data.")
+        return
     # discard empty signals and learning signals
-    default_keys = [
-        key for key in pmu_data.signal 
-        if not key.startswith('LEARN_') 
-        and np.ptp(pmu_data.signal[key])>0
-    ]
-    keys = st.multiselect("Select Signals to Display", list(pmu_data.signal.keys()), default=default_keys)
+    keys = st.multiselect("Select Signals to Display", pmu_summary.keys, default=pmu_summary.signal_keys)
     show_trigger = st.checkbox("Show Trigger Events", value=True)
 
-    plot_signals_streamlit(pmu_data, keys, show_trigger)
\ No newline at end of file
+    with profiling.span("plot_signals_streamlit"):
+        plot_signals_streamlit(pmu_summary, keys, show_trigger)
+
+    redetect_triggers(pmu_summary)
+
+
+def redetect_triggers(pmu_summary):
+    st.subheader("Trigger re-detection")
+    detectable_keys = [
+        key for key in pmu_summary.signal_keys
+        if key.startswith(tuple(DETECTION_PARAMETERS)) and not key.endswith('_DETECTED')
+    ]
+    if not detectable_keys:
+        st.info("No ECG, PULS or RESP signal to detect triggers from.")
+        return
+    key = st.selectbox("Detect triggers from signal:", detectable_keys)
+    if st.button("Detect triggers"):
+        with st.spinner("Detecting triggers..."), profiling.span("trigger detection"):
+            detected_key = add_detected_triggers(st.session_state.twix['pmu'], key)
+            st.session_state.pmu_summary = pmu_summary = PMUSummary(st.session_state.twix['pmu'])
+            st.session_state.shot_indexes.pop(detected_key, None)
+        st.success(f"Triggers detected from {key} are available as trigger method '{detected_key}'.")
+        if pmu_summary.has_trigger[key]:
+            agreement = compare_triggers(pmu_summary.trigger_times[key], pmu_summary.trigger_times[detected_key])
+            st.write("Agreement with the scanner triggers:")
+            st.dataframe(pd.DataFrame([agreement]), hide_index=True)
+        else:
+            st.info(f"No scanner triggers recorded on {key} to compare with.")
\ No newline at end of file
@@ -3,13 +3,16 @@ import time
 import plotly.graph_objects as go
 import numpy as np
 
-from utils.twix_dataframe import build_line_dataframe
+from streamlit_pages.figure_export import figure_export
+from utils import profiling
+from utils.twix_dataframe import update_trigger_method
 
 def udpate_trigger_method():
-    st.session_state.df = build_line_dataframe(
-        st.session_state.twix, 
+    st.session_state.df = update_trigger_method(
+        st.session_state.df,
+        st.session_state.twix,
         trigger_method=st.session_state.trigger_method,
-        include_patrefscan=not st.session_state.recotwix.prot.isRefScanSeparate,
+        shot_index_cache=st.session_state.shot_indexes,
     )
 
 def plot_hist(df, rd_min=None, rd_max=None):
@@ -61,15 +64,9 @@ def pmu_stats():
         return
     
     # Choose trigger method
-    pmu_data = twix['pmu']
-    default_keys = [
-        key for key in pmu_data.signal 
-        if not key.startswith('LEARN_') 
-        and np.any(pmu_data.trigger[key])
-    ]
     selected = st.selectbox(
         "Choose a trigger method:", 
-        default_keys,
+        st.session_state.pmu_summary.trigger_keys,
         key='trigger_method',
         on_change=udpate_trigger_method
     )
@@ -81,11 +78,19 @@ def pmu_stats():
     # Sidebar controls for scaling
     scale_hist = st.sidebar.checkbox("Scale x-axis (RD)", value=True)
 
+    df = df[df.RD.notna()] # discard readouts without a valid preceding RR
+    if df.empty:
+        st.error(f"❗ No readout with a valid recovery duration for trigger method '{selected}'.")
+        return
     if scale_hist or np.ptp(df.RD)==0: # if all RD values are the same, allow scaling to visualize the histogram
         rd_min = st.sidebar.slider("RD Min (s)", 0.0, 5.0, 0.5, step=0.1)
         rd_max = st.sidebar.slider("RD Max (s)", 0.5, 10.0, 1.5, step=0.1)
     else:
         rd_min, rd_max = None, None
         
-    fig = plot_hist(df, rd_min, rd_max)
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    with profiling.span("figure construction"):
+        fig = plot_hist(df, rd_min, rd_max)
+    profiling.record_figure("RD histogram", fig)
+    with profiling.span("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+    figure_export(fig, "recovery_durations_histogram", (selected, len(df), rd_min, rd_max))
\ No newline at end of file
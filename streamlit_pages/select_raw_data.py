@@ -1,8 +1,10 @@
 import streamlit as st
+import hashlib
 import os
-from recotwix import recotwix
 import tempfile
+from utils import profiling
 from utils.twix_dataframe import build_line_dataframe
+from utils.pmu_summary import PMUSummary
 
 def select_raw_data():
     st.title("Select Raw Data")
@@ -13,17 +15,33 @@ def select_raw_data():
     if uploaded_file is not None:
         with st.spinner("Reading Twix file..."):
             # 1. Save uploaded file to a persistent temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".dat") as tmp:
-                tmp.write(uploaded_file.read())
+            with profiling.span("save upload"), tempfile.NamedTemporaryFile(delete=False, suffix=".dat") as tmp:
+                content = uploaded_file.read()
+                tmp.write(content)
                 st.session_state.temp_file_path = tmp.name
+                # identifies the content of the file, e.g. for caches shared by all sessions
+                st.session_state.file_digest = hashlib.sha1(content).hexdigest()
+                del content
             
             # 2. Load recotwix with the saved file
             try:
-                reco = recotwix(filename=st.session_state.temp_file_path)
+                from recotwix import recotwix # imported here as its reconstruction stack is slow to import
+                with profiling.span("recotwix parsing"):
+                    reco = recotwix(filename=st.session_state.temp_file_path)
                 st.session_state.recotwix = reco
                 st.session_state.twix = reco.twixobj
                 st.success("File loaded successfully!")
-                st.session_state.df = build_line_dataframe(reco.twixobj, include_patrefscan=not reco.prot.isRefScanSeparate)
+                st.session_state.shot_indexes = {}
+                st.session_state.navigator_timestamps = None
+                st.session_state.kspace_coverage = None
+                with profiling.span("PMU summary"):
+                    st.session_state.pmu_summary = PMUSummary(reco.twixobj['pmu']) if 'pmu' in reco.twixobj else None
+                with profiling.span("build_line_dataframe"):
+                    st.session_state.df = build_line_dataframe(
+                        reco.twixobj,
+                        include_patrefscan=not reco.prot.isRefScanSeparate,
+                        shot_index_cache=st.session_state.shot_indexes,
+                    )
                 st.session_state.file = os.path.basename(uploaded_file.name)
                 st.session_state.img_nii = None
                 st.session_state.image_buffer = None
@@ -0,0 +1,42 @@
+import numpy as np
+
+from utils.optimized_pulse import find_corrupted_shot
+from utils.sweep import shift_triggers_to_inversion, simulate_configuration, optimize_pulse
+
+def synthetic_scan():
+    # regular RR of 1 s with long RRs before shots 11 and 26, no readout before the second trigger
+    RRs = np.full(40, 1.)
+    RRs[[10, 25]] = 2.
+    trigger_times = np.concatenate([[0.], np.cumsum(RRs)])
+    readout_times = np.concatenate([t + 0.5 + 5e-3*np.arange(30) for t in trigger_times[1:-1]])
+    corrupted_shots = np.flatnonzero(find_corrupted_shot(np.diff(trigger_times), tolerance=0.15, precision=5e-2))
+    return trigger_times, readout_times, corrupted_shots
+
+def simulate(correction_method, t_a=None, alpha_b=None):
+    trigger_times, readout_times, corrupted_shots = synthetic_scan()
+    return simulate_configuration(dict(
+        TI=0.4,
+        T1=1.,
+        FA=20.,
+        readout_times=readout_times,
+        trigger_times=shift_triggers_to_inversion(trigger_times, readout_times, 0.4),
+        corrupted_shots=corrupted_shots,
+        t_a=t_a,
+        alpha_b=alpha_b,
+        correction_method=correction_method,
+    ))
+
+def test_uncorrected_shots_are_not_corrected():
+    assert simulate('None')['Corrected fraction'] == 0.
+
+def test_dummy_scan_discards_corrupted_shots():
+    assert simulate('Dummy scan')['Mz center variance'] < 1e-3 * simulate('None')['Mz center variance']
+
+def test_optimized_pulse_corrects_corrupted_shots():
+    trigger_times, readout_times, _ = synthetic_scan()
+    inversion_times = shift_triggers_to_inversion(trigger_times, readout_times, 0.4)
+    t_a, alpha_b = optimize_pulse((inversion_times, readout_times, 0.4, 'gradient'))
+    corrected = simulate('One optimized pulse', t_a, alpha_b)
+    uncorrected = simulate('None')
+    assert corrected['Corrected fraction'] > 0
+    assert corrected['Mz center variance'] < uncorrected['Mz center variance']
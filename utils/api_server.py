@@ -0,0 +1,451 @@
+"""Local HTTP/JSON API serving the analyses of the app to other tools, without a browser.
+
+Scans are parsed once and shared by all the requests. Table results are served as JSON, or as an Arrow IPC
+stream with `format=arrow` (requires pyarrow). Line tables are built in a thread pool and simulations and pulse
+optimizations run in a process pool, so a slow optimization does not block quick metadata queries.
+
+Endpoints (parameters are given in the query string or in a JSON body):
+    POST /scans                        load a scan: path
+    GET  /scans                        loaded scans
+    GET  /scans/<id>                   metadata of a scan
+    GET  /scans/<id>/lines             line table: trigger_method, format
+    GET  /scans/<id>/triggers          trigger times and RR statistics: trigger_method
+    GET  /scans/<id>/corrupted_shots   corrupted shots: trigger_method, tolerance, precision
+    POST /scans/<id>/optimal_pulse     optimized correction pulses: trigger_method, TI, solver
+    POST /scans/<id>/simulation        Mz series: T1, FA, TI, trigger_method, correction_method, t_a, alpha_b,
+                                       solver, reordering, do_SPPRESS, max_points, format
+
+Usage:
+    python -m utils.api_server [--host 127.0.0.1] [--port 8600] [--workers 4] [file.dat ...]
+"""
+############################
+# Import necessary libraries
+############################
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from utils.optimized_pulse import find_corrupted_shot
+from utils.pmu_summary import PMUSummary
+from utils.sweep import shift_triggers_to_inversion, optimize_pulse, simulate_series, CORRECTION_METHODS
+from utils.twix_dataframe import build_line_dataframe, update_trigger_method, get_trigger_timing
+
+# correction methods of the sweep, plus a pulse given by the caller as on the magnetization page.
+# 'Dummy scan' is simulated without correction and returns the corrupted shots that the caller discards.
+SIMULATION_CORRECTION_METHODS = CORRECTION_METHODS + ['Custom pulse']
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+JSON_CONTENT_TYPE = 'application/json'
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+############################
+# Useful functions
+############################
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def to_json(obj):
+    return json.dumps(obj, default=json_default).encode()
+
+def to_arrow(df):
+    """Serialize a DataFrame to an Arrow IPC stream."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Arrow output requires pyarrow, use format=json.")
+    df = df.copy(deep=False)
+    df.attrs = {} # raw timestamps in attrs are not serializable as Arrow metadata
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def table_response(df, format='json'):
+    if format == 'arrow':
+        return ARROW_CONTENT_TYPE, to_arrow(df)
+    if format == 'json':
+        return JSON_CONTENT_TYPE, df.to_json(orient='split', index=False).encode()
+    raise ValueError(f"Unknown format '{format}', use 'json' or 'arrow'.")
+
+class Scan:
+    """A parsed scan with its line tables and shot indexes per trigger method, built on demand."""
+
+    def __init__(self, path, reco):
+        self.path = path
+        self.twix = reco.twixobj
+        self.include_patrefscan = not reco.prot.isRefScanSeparate
+        self.pmu_summary = PMUSummary(self.twix['pmu']) if 'pmu' in self.twix else None
+        self.shot_indexes = {}
+        self.lines = {}
+        self.lock = threading.Lock()
+
+    @property
+    def TI(self):
+        return self.twix['hdr']['Meas']['alTI'][0]*1e-6 # convert to seconds
+
+    @property
+    def FA(self):
+        return self.twix['hdr']['Meas']['adFlipAngleDegree'][0]
+
+    def metadata(self):
+        return {
+            'file': os.path.basename(self.path),
+            'path': self.path,
+            'TI': self.TI,
+            'FA': self.FA,
+            'is3D': self.twix['hdr']['Config']['Is3D'].lower() == 'true',
+            'signal_channels': self.pmu_summary.signal_keys if self.pmu_summary else [],
+            'trigger_channels': self.pmu_summary.trigger_keys if self.pmu_summary else [],
+        }
+
+    def get_lines(self, trigger_method='ECG1'):
+        """Line table of the scan for a trigger method, the first one is built from the MDHs and the others
+        are retimed from it."""
+        with self.lock:
+            if trigger_method not in self.lines:
+                if self.lines:
+                    self.lines[trigger_method] = update_trigger_method(
+                        next(iter(self.lines.values())), self.twix, trigger_method, self.shot_indexes,
+                    )
+                else:
+                    self.lines[trigger_method] = build_line_dataframe(
+                        self.twix,
+                        trigger_method=trigger_method,
+                        include_patrefscan=self.include_patrefscan,
+                        shot_index_cache=self.shot_indexes,
+                    )
+            return self.lines[trigger_method]
+
+    def get_timings(self, trigger_method, TI):
+        """Trigger times shifted to the inversion pulses and sorted readout times, as used by the simulations."""
+        df = self.get_lines(trigger_method)
+        if trigger_method not in self.shot_indexes:
+            raise ValueError(f"No triggers found for trigger method '{trigger_method}'.")
+        readout_times = np.sort(df.Time.values)
+        trigger_times = shift_triggers_to_inversion(self.shot_indexes[trigger_method].trigger_times, readout_times, TI)
+        return trigger_times, readout_times
+
+
+def parse_scan(path):
+    from recotwix import recotwix # imported here as its reconstruction stack is slow to import
+    return Scan(path, recotwix(filename=path))
+
+
+class ScanCache:
+    """Parsed scans shared by all the requests, at most max_scans are kept (least recently used first out).
+
+    Concurrent requests for a scan being parsed wait for the same parsing.
+    """
+
+    def __init__(self, executor, max_scans=4):
+        self.executor = executor
+        self.max_scans = max_scans
+        self.scans = OrderedDict() # scan id -> future of the Scan
+
+    @staticmethod
+    def get_scan_id(path):
+        digest = hashlib.sha1(f"{path}:{os.path.getmtime(path)}".encode())
+        return digest.hexdigest()[:12]
+
+    def load(self, path):
+        """Future of the scan of a file, parsed in the executor if it is not cached."""
+        path = os.path.realpath(path)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No such file: '{path}'.")
+        scan_id = self.get_scan_id(path)
+        if scan_id not in self.scans:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, parse_scan, path)
+            future.add_done_callback(lambda future: self._forget_failed(scan_id, future))
+            self.scans[scan_id] = future
+            while len(self.scans) > self.max_scans:
+                self.scans.popitem(last=False)
+        self.scans.move_to_end(scan_id)
+        return scan_id, self.scans[scan_id]
+
+    async def get(self, scan_id):
+        if scan_id not in self.scans:
+            raise HTTPError(404, f"Unknown scan '{scan_id}', load it with POST /scans.")
+        self.scans.move_to_end(scan_id)
+        return await self.scans[scan_id]
+
+    def _forget_failed(self, scan_id, future):
+        # failed parsings are not cached so that they can be retried
+        if not future.cancelled() and future.exception() is not None and self.scans.get(scan_id) is future:
+            del self.scans[scan_id]
+
+############################
+# Main functions
+############################
+
+class AnalysisServer:
+    """Asyncio HTTP server of the analysis API.
+
+    Args:
+        max_workers (int, optional): number of processes for the simulations and optimizations.
+            Defaults to the number of CPUs.
+        max_scans (int, optional): maximum number of parsed scans kept in memory. Defaults to 4.
+    """
+
+    def __init__(self, max_workers=None, max_scans=4):
+        self.thread_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='api')
+        # forkserver workers do not inherit the listening socket and the connections of the server
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('forkserver'),
+        )
+        self.scans = ScanCache(self.thread_pool, max_scans=max_scans)
+        self.routes = [
+            ('POST', r'/scans', self.load_scan),
+            ('GET', r'/scans', self.list_scans),
+            ('GET', r'/scans/(?P<scan_id>\w+)', self.scan_metadata),
+            ('GET', r'/scans/(?P<scan_id>\w+)/lines', self.lines),
+            ('GET', r'/scans/(?P<scan_id>\w+)/triggers', self.triggers),
+            ('GET', r'/scans/(?P<scan_id>\w+)/corrupted_shots', self.corrupted_shots),
+            ('POST', r'/scans/(?P<scan_id>\w+)/optimal_pulse', self.optimal_pulse),
+            ('POST', r'/scans/(?P<scan_id>\w+)/simulation', self.simulation),
+        ]
+
+    async def in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.thread_pool, fn, *args)
+
+    async def in_process(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.process_pool, fn, *args)
+
+    # Endpoints, each returns (content type, body) or a JSON serializable object
+
+    async def load_scan(self, params):
+        if 'path' not in params:
+            raise ValueError("Missing parameter 'path'.")
+        scan_id, future = self.scans.load(params['path'])
+        scan = await future
+        return {'id': scan_id, **scan.metadata()}
+
+    async def list_scans(self, params):
+        return [
+            {'id': scan_id, 'loaded': future.done() and future.exception() is None}
+            for scan_id, future in self.scans.scans.items()
+        ]
+
+    async def scan_metadata(self, params, scan_id):
+        scan = await self.scans.get(scan_id)
+        return {'id': scan_id, **scan.metadata()}
+
+    async def lines(self, params, scan_id):
+        scan = await self.scans.get(scan_id)
+        df = await self.in_thread(scan.get_lines, params.get('trigger_method', 'ECG1'))
+        return table_response(df, params.get('format', 'json'))
+
+    async def triggers(self, params, scan_id):
+        scan = await self.scans.get(scan_id)
+        trigger_times = await self.in_thread(get_trigger_timing, scan.twix, params.get('trigger_method', 'ECG1'))
+        RRs = np.diff(trigger_times)
+        return {
+            'trigger_times': trigger_times,
+            'RR': {
+                'count': len(RRs),
+                'mean': np.mean(RRs) if len(RRs) else None,
+                'std': np.std(RRs) if len(RRs) else None,
+                'median': np.median(RRs) if len(RRs) else None,
+                'min': np.min(RRs) if len(RRs) else None,
+                'max': np.max(RRs) if len(RRs) else None,
+            },
+        }
+
+    async def corrupted_shots(self, params, scan_id):
+        scan = await self.scans.get(scan_id)
+        trigger_times = await self.in_thread(get_trigger_timing, scan.twix, params.get('trigger_method', 'ECG1'))
+        corrupted = find_corrupted_shot(
+            np.diff(trigger_times),
+            tolerance=float(params.get('tolerance', 0.15)),
+            precision=float(params.get('precision', 5e-2)),
+        )
+        return {'shots': len(corrupted), 'corrupted_shots': np.flatnonzero(corrupted)}
+
+    async def optimal_pulse(self, params, scan_id):
+        scan = await self.scans.get(scan_id)
+        TI = float(params.get('TI', scan.TI))
+        trigger_times, readout_times = await self.in_thread(
+            scan.get_timings, params.get('trigger_method', 'ECG1'), TI,
+        )
+        t_a, alpha_b = await self.in_process(
+            optimize_pulse, (trigger_times, readout_times, TI, params.get('solver', 'gradient')),
+        )
+        return {'t_a': t_a, 'alpha_b': alpha_b}
+
+    async def simulation(self, params, scan_id):
+        scan = await self.scans.get(scan_id)
+        if 'T1' not in params:
+            raise ValueError("Missing parameter 'T1'.")
+        TI = params.get('TI', scan.TI)
+        FA = params.get('FA', scan.FA)
+        TI, FA = np.asarray(TI, dtype=float), np.asarray(FA, dtype=float) # scalars or arrays per shot/readout
+        trigger_method = params.get('trigger_method', 'ECG1')
+        correction_method = params.get('correction_method', 'None')
+        if correction_method not in SIMULATION_CORRECTION_METHODS:
+            raise ValueError(
+                f"Unknown correction method '{correction_method}', choose among {SIMULATION_CORRECTION_METHODS}."
+            )
+        if TI.ndim > 1 or FA.ndim > 1 or TI.size == 0 or FA.size == 0:
+            raise ValueError("TI and FA must be numbers or non-empty lists of numbers.")
+        TI_first = float(TI.flat[0]) # the triggers are shifted with the TI of the first shot
+        trigger_times, readout_times = await self.in_thread(scan.get_timings, trigger_method, TI_first)
+        if TI.ndim and len(TI) != len(trigger_times):
+            raise ValueError(f"TI must have one value per shot, got {len(TI)} values for {len(trigger_times)} shots.")
+        if FA.ndim and len(FA) != len(readout_times):
+            raise ValueError(
+                f"FA must have one value per readout, got {len(FA)} values for {len(readout_times)} readouts."
+            )
+
+        t_a, alpha_b, corrupted_shots = None, None, []
+        if correction_method != 'None':
+            corrupted_shots = np.flatnonzero(find_corrupted_shot(np.diff(trigger_times), tolerance=0.15, precision=5e-2))
+        if correction_method == 'One optimized pulse':
+            t_a, alpha_b = await self.in_process(
+                optimize_pulse, (trigger_times, readout_times, TI_first, params.get('solver', 'gradient')),
+            )
+        elif correction_method == 'Custom pulse':
+            t_a, alpha_b = float(params.get('t_a', 0.1)), float(params.get('alpha_b', 90.))
+
+        max_points = params.get('max_points')
+        all_times, all_Mz, all_times_center, all_Mz_center = await self.in_process(simulate_series, dict(
+            TI=TI if TI.ndim else float(TI),
+            T1=float(params['T1']),
+            FA=FA if FA.ndim else float(FA),
+            readout_times=readout_times,
+            trigger_times=trigger_times,
+            corrupted_shots=corrupted_shots,
+            t_a=t_a,
+            alpha_b=alpha_b,
+            do_SPPRESS=str(params.get('do_SPPRESS', True)).lower() not in ('false', '0'),
+            reordering=params.get('reordering', 'Centric'),
+            adaptive=max_points is not None,
+            max_points=int(max_points) if max_points is not None else None,
+        ))
+        if params.get('format', 'json') == 'arrow':
+            import pandas as pd
+            # the center readouts are appended to the series with Center set to True
+            df = pd.DataFrame({
+                'Time': np.concatenate([all_times, all_times_center]),
+                'Mz': np.concatenate([all_Mz, all_Mz_center]),
+                'Center': np.arange(len(all_times) + len(all_times_center)) >= len(all_times),
+            })
+            return table_response(df, 'arrow')
+        return {
+            'times': all_times,
+            'Mz': all_Mz,
+            'center_times': all_times_center,
+            'center_Mz': all_Mz_center,
+            'corrupted_shots': corrupted_shots,
+            't_a': t_a,
+            'alpha_b': alpha_b,
+        }
+
+    # HTTP
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        if body:
+            params.update(json.loads(body))
+        path = url.path.rstrip('/') or '/'
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method == method:
+                result = await handler(params, **match.groupdict())
+                if isinstance(result, tuple):
+                    return result
+                return JSON_CONTENT_TYPE, to_json(result)
+        raise HTTPError(405 if allowed else 404, f"No route for {method} {path}.")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            if not request_line.strip():
+                return
+            try:
+                try:
+                    method, target, _ = request_line.split(' ', 2)
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    body = await reader.readexactly(int(headers.get('content-length', 0)))
+                except (ValueError, asyncio.IncompleteReadError):
+                    raise HTTPError(400, f"Malformed request: {request_line.strip()!r}.")
+                content_type, payload = await self.dispatch(method.upper(), target, body)
+                status = 200
+            except HTTPError as e:
+                status, content_type, payload = e.status, JSON_CONTENT_TYPE, to_json({'error': str(e)})
+            except FileNotFoundError as e:
+                status, content_type, payload = 404, JSON_CONTENT_TYPE, to_json({'error': str(e)})
+            except (ValueError, KeyError, TypeError, AssertionError) as e:
+                status, content_type, payload = 400, JSON_CONTENT_TYPE, to_json({'error': str(e)})
+            except Exception as e:
+                status, content_type, payload = 500, JSON_CONTENT_TYPE, to_json({'error': repr(e)})
+            writer.write((
+                f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode('latin-1') + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8600, files=()):
+        for path in files:
+            scan_id, _ = self.scans.load(path)
+            print(f"Loading {path} as scan {scan_id}")
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving the analysis API on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.thread_pool.shutdown(wait=False, cancel_futures=True)
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="raw data .dat files loaded at startup")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on, local only by default")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=None, help="number of processes for simulations")
+    parser.add_argument("--max-scans", type=int, default=4, help="maximum number of parsed scans kept in memory")
+    args = parser.parse_args()
+    server = AnalysisServer(max_workers=args.workers, max_scans=args.max_scans)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.files))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Render the figures of many raw data files to images without running the app.
+
+Each file is parsed, its line DataFrame built and its k-space timing map, recovery durations map and recovery
+durations histogram rendered by the shared figure renderer into one directory per file.
+
+Usage:
+    python -m utils.batch_reports file1.dat file2.dat ... --output reports [--format png svg] [--workers 4]
+"""
+############################
+# Import necessary libraries
+############################
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.figure_rendering import FigureRenderer
+from utils.twix_dataframe import build_line_dataframe
+
+############################
+# Useful functions
+############################
+
+def build_figures(twix, df, trigger_method='ECG1'):
+    """Figures of the report of one file, as {name: figure}."""
+    # the plot functions live with their page, streamlit is only imported
+    from streamlit_pages.kspace_timing_map import plot_fig as plot_timing_map
+    from streamlit_pages.kspace_recovery_durations import plot_fig as plot_recovery_durations
+    from streamlit_pages.pmu_stats import plot_hist
+    is3D = twix['hdr']['Config']['Is3D'].lower() == 'true'
+    figures = {"kspace_timing_map": plot_timing_map(df, 6, is3D, False)}
+    if 'RD' in df.columns:
+        figures["recovery_durations_map"] = plot_recovery_durations(df, 6, is3D, False, 0.4, 2.0)
+        figures["recovery_durations_histogram"] = plot_hist(df[df.RD.notna()], 0.5, 1.5)
+    return figures
+
+def render_report(filename, output_dir, formats=('png',), trigger_method='ECG1'):
+    """Parse a raw data file and render its figures to output_dir/<file name>/<figure>.<format>.
+
+    Args:
+        filename (str): path of the .dat file.
+        output_dir (str): directory of the reports.
+        formats (tuple, optional): image formats. Defaults to ('png',).
+        trigger_method (str, optional): PMU channel used for the recovery durations. Defaults to 'ECG1'.
+
+    Returns:
+        list: paths of the written images.
+    """
+    from recotwix import recotwix # imported here as its reconstruction stack is slow to import
+    reco = recotwix(filename=filename)
+    df = build_line_dataframe(
+        reco.twixobj,
+        trigger_method=trigger_method,
+        include_patrefscan=not reco.prot.isRefScanSeparate,
+    )
+    figures = build_figures(reco.twixobj, df, trigger_method)
+
+    report_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(filename))[0])
+    os.makedirs(report_dir, exist_ok=True)
+    # all the figures of the file are rendered concurrently, without caching as each is rendered once
+    renderer = FigureRenderer(max_cached=0)
+    futures = {
+        os.path.join(report_dir, f"{name}.{format}"): renderer.submit(fig, format)
+        for name, fig in figures.items() for format in formats
+    }
+    for path, future in futures.items():
+        with open(path, 'wb') as f:
+            f.write(future.result())
+    renderer.executor.shutdown()
+    return list(futures)
+
+############################
+# Main function
+############################
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="raw data .dat files")
+    parser.add_argument("--output", default="reports", help="output directory")
+    parser.add_argument("--format", nargs="+", default=["png"], choices=["png", "svg", "jpeg", "pdf"])
+    parser.add_argument("--trigger-method", default="ECG1", help="PMU channel used for the recovery durations")
+    parser.add_argument("--workers", type=int, default=None, help="number of files processed in parallel")
+    args = parser.parse_args()
+
+    # files are parsed in separate processes, parsing is CPU bound
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            filename: executor.submit(render_report, filename, args.output, tuple(args.format), args.trigger_method)
+            for filename in args.files
+        }
+        for filename, future in futures.items():
+            try:
+                paths = future.result()
+                print(f"{filename}: {len(paths)} images")
+            except Exception as e:
+                print(f"{filename}: failed ({e})")
+
+if __name__ == "__main__":
+    main()
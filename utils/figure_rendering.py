@@ -0,0 +1,93 @@
+############################
+# Import necessary libraries
+############################
+
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MIME_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'jpeg': 'image/jpeg',
+    'pdf': 'application/pdf',
+}
+
+############################
+# Useful functions
+############################
+
+def get_figure_key(fig, inputs=None):
+    """Hash identifying a figure: of its inputs if given (cheap), otherwise of its JSON."""
+    content = repr(inputs) if inputs is not None else fig.to_json()
+    return hashlib.sha1(content.encode()).hexdigest()
+
+def render_figure(fig, format='png', width=None, height=None, scale=1):
+    """Render a plotly figure to image bytes (requires kaleido)."""
+    return fig.to_image(format=format, width=width, height=height, scale=scale)
+
+
+class FigureRenderer:
+    """Render plotly figures to images in worker threads and keep the bytes in a LRU cache.
+
+    Args:
+        max_workers (int, optional): number of rendering threads. Defaults to 2.
+        max_cached (int, optional): maximum number of images kept in memory. Defaults to 128.
+    """
+
+    def __init__(self, max_workers=2, max_cached=128):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='figure-rendering')
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, fig, format='png', inputs=None, width=None, height=None, scale=1):
+        """Render a figure in a worker thread, or return the cached image.
+
+        Args:
+            fig (go.Figure): figure to render.
+            format (str, optional): image format among MIME_TYPES. Defaults to 'png'.
+            inputs (optional): hashable description of the inputs of the figure used as cache key,
+                the JSON of the figure is hashed if None. Defaults to None.
+            width (int, optional): image width in pixels. Defaults to the figure width.
+            height (int, optional): image height in pixels. Defaults to the figure height.
+            scale (float, optional): scale factor of the image. Defaults to 1.
+
+        Returns:
+            Future: future of the image bytes.
+        """
+        key = (get_figure_key(fig, inputs), format, width, height, scale)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            future = self.executor.submit(render_figure, fig, format, width, height, scale)
+            self.cache[key] = future
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+        future.add_done_callback(lambda future: self._forget_failed(key, future))
+        return future
+
+    def render(self, fig, format='png', inputs=None, width=None, height=None, scale=1):
+        """Same as submit but wait for the image bytes."""
+        return self.submit(fig, format, inputs, width, height, scale).result()
+
+    def _forget_failed(self, key, future):
+        # failed renderings are not cached so that they can be retried
+        if future.exception() is not None:
+            with self.lock:
+                if self.cache.get(key) is future:
+                    del self.cache[key]
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+def get_renderer():
+    """Renderer shared by all the sessions of the app."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = FigureRenderer()
+        return _renderer
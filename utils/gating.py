@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# Counters identifying a k-space line, a line acquired again later was rejected the first time
+LINE_COUNTERS = ['Lin', 'Par', 'Sli', 'Rep', 'Ave', 'Eco', 'Set', 'Phs', 'Seg']
+
+def get_rejected_readouts(df):
+    """
+    Find the readouts whose k-space line is acquired again later, i.e. rejected by the gating.
+
+    Parameters:
+    - df: Line DataFrame built by build_line_dataframe.
+
+    Returns:
+    - Boolean array aligned with the rows of df, True for rejected readouts.
+    """
+    # separate reference lines share their counters with image lines and must not be seen as repetitions
+    is_refscan = (df.Flags.str.contains('PATREFSCAN') & ~df.Flags.str.contains('PATREFANDIMASCAN')).values
+    counters = [counter for counter in LINE_COUNTERS if counter in df.columns]
+    rejected = np.zeros(len(df), dtype=bool)
+    for group in (is_refscan, ~is_refscan):
+        idxs = np.flatnonzero(group)
+        idxs = idxs[np.argsort(df.Time.values[idxs], kind='stable')]
+        rejected[idxs] = df.iloc[idxs].duplicated(subset=counters, keep='last').values
+    return rejected
+
+
+def compute_shot_gating(df, shot_starts):
+    """
+    Reconstruct the accept/reject decision of each shot.
+
+    A shot starts at a navigator (or trigger) and lasts until the next one. It is accepted if at least one of its
+    readouts is kept, i.e. its k-space line is not acquired again later.
+
+    Parameters:
+    - df: Line DataFrame built by build_line_dataframe.
+    - shot_starts: Sorted start times of the shots in seconds, e.g. navigator times.
+
+    Returns:
+    - A pandas DataFrame with one row per shot and columns 'Start', 'Duration', 'Readouts', 'Kept' and 'Accepted'.
+    """
+    shot_starts = np.asarray(shot_starts, dtype=float)
+    times = df.Time.values
+    shot_ids = np.searchsorted(shot_starts, times, side='right') - 1
+    in_shot = shot_ids >= 0
+    kept = ~get_rejected_readouts(df)
+    n_readouts = np.bincount(shot_ids[in_shot], minlength=len(shot_starts))
+    n_kept = np.bincount(shot_ids[in_shot], weights=kept[in_shot], minlength=len(shot_starts)).astype(int)
+    shot_ends = np.append(shot_starts[1:], max(times.max() if len(times) else shot_starts[-1], shot_starts[-1]))
+    return pd.DataFrame({
+        'Start': shot_starts,
+        'Duration': shot_ends - shot_starts,
+        'Readouts': n_readouts,
+        'Kept': n_kept,
+        'Accepted': n_kept > 0,
+    })
+
+
+def compute_efficiency(shots, bin_duration=30.):
+    """
+    Gating efficiency over time: fraction of the scan time spent on accepted shots in consecutive time bins.
+
+    Parameters:
+    - shots: Shot DataFrame returned by compute_shot_gating.
+    - bin_duration: Duration of the time bins in seconds (default is 30).
+
+    Returns:
+    - A pandas DataFrame with columns 'Time' (bin center), 'Efficiency' and 'Cumulative efficiency'.
+    """
+    start, end = shots.Start.iloc[0], (shots.Start + shots.Duration).iloc[-1]
+    edges = np.arange(start, end + bin_duration, bin_duration)
+    total, _ = np.histogram(shots.Start, bins=edges, weights=shots.Duration)
+    accepted, _ = np.histogram(shots.Start, bins=edges, weights=shots.Duration * shots.Accepted)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame({
+            'Time': (edges[:-1] + edges[1:]) / 2,
+            'Efficiency': accepted / total,
+            'Cumulative efficiency': np.cumsum(accepted) / np.cumsum(total),
+        })
+
+
+def summarize_gating(shots):
+    """
+    Summary of the gating of a scan.
+
+    Parameters:
+    - shots: Shot DataFrame returned by compute_shot_gating.
+
+    Returns:
+    - A dictionary with the number of shots, the accepted shots, the scan efficiency, the dead time spent on rejected
+    shots and the longest run of consecutive rejected shots.
+    """
+    accepted = shots.Accepted.values
+    total_time = shots.Duration.sum()
+    dead_time = shots.Duration[~accepted].sum()
+    # lengths of the runs of consecutive rejected shots
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], (~accepted).astype(int), [0]])))
+    runs = edges[1::2] - edges[::2]
+    cumulative_duration = np.concatenate([[0], np.cumsum(shots.Duration.values)])
+    run_durations = cumulative_duration[edges[1::2]] - cumulative_duration[edges[::2]]
+    return {
+        'Shots': len(shots),
+        'Accepted shots': int(accepted.sum()),
+        'Acceptance rate': accepted.mean() if len(shots) else np.nan,
+        'Scan time (s)': total_time,
+        'Efficiency': (total_time - dead_time) / total_time if total_time > 0 else np.nan,
+        'Dead time (s)': dead_time,
+        'Longest rejection run (shots)': int(runs.max()) if len(runs) else 0,
+        'Longest rejection run (s)': run_durations.max() if len(runs) else 0.,
+    }
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+def get_kspace_center(twix, df=None):
+    """
+    Get the k-space center line and partition from the MDH of the first image scan.
+
+    Parameters:
+    - twix: The twix data structure.
+    - df: Optional line DataFrame, whose middle line and partition are used if the MDH has no center.
+
+    Returns:
+    - Tuple (center line, center partition).
+    """
+    for mdb in twix['mdb']:
+        if mdb.is_image_scan() and hasattr(mdb.mdh, 'CenterLin'):
+            return int(mdb.mdh.CenterLin), int(mdb.mdh.CenterPar)
+    if df is not None:
+        return (df.Lin.min() + df.Lin.max()) // 2, (df.Par.min() + df.Par.max()) // 2
+    raise ValueError("No image scan with a k-space center found.")
+
+
+def get_radial_distance(df, center_lin, center_par):
+    """
+    Distance of each line to the k-space center, with Lin and Par normalised so that the furthest line of each
+    direction is at 1.
+    """
+    distance = np.zeros(len(df))
+    for counter, center in (('Lin', center_lin), ('Par', center_par)):
+        offset = df[counter].values.astype(float) - center
+        extent = np.abs(offset).max() if len(offset) else 0
+        if extent > 0:
+            distance += (offset / extent)**2
+    return np.sqrt(distance)
+
+
+def compute_kspace_coverage(df, center_lin, center_par, n_bands=10, center_radius=0.1):
+    """
+    Summarise when each region of k-space was acquired and the recovery durations during the k-space center.
+
+    Parameters:
+    - df: Line DataFrame built by build_line_dataframe.
+    - center_lin: k-space center line.
+    - center_par: k-space center partition.
+    - n_bands: Number of radial distance bands between the center and the furthest line (default is 10).
+    - center_radius: Normalised radial distance under which lines belong to the k-space center (default is 0.1).
+
+    Returns:
+    - bands: DataFrame with one row per radial band: number of lines, first, median and last acquisition time
+    (relative to the first readout) and, if available, mean and standard deviation of the RD.
+    - slices: DataFrame with one row per slice: time of the k-space center line, first and last time of the
+    center region and, if available, spread of the RD during the center region.
+    - center: Dictionary with the RD statistics of all center lines.
+    """
+    has_RD = 'RD' in df.columns
+    times = df.Time.values - df.Time.min()
+    distance = get_radial_distance(df, center_lin, center_par)
+    edges = np.linspace(0, distance.max() if len(distance) else 1, n_bands + 1)
+    band = np.clip(np.searchsorted(edges, distance, side='right') - 1, 0, n_bands - 1)
+    lines = pd.DataFrame({
+        'Band': band,
+        'Sli': df.Sli.values,
+        'Time': times,
+        'RD': df.RD.values if has_RD else np.nan,
+        'Center': distance <= center_radius,
+        'CenterLine': (df.Lin.values == center_lin) & (df.Par.values == center_par),
+    })
+
+    aggregations = {
+        'Lines': ('Time', 'size'),
+        'First time (s)': ('Time', 'min'),
+        'Median time (s)': ('Time', 'median'),
+        'Last time (s)': ('Time', 'max'),
+    }
+    if has_RD:
+        aggregations.update({'Mean RD (s)': ('RD', 'mean'), 'RD std (s)': ('RD', 'std')})
+    bands = lines.groupby('Band').agg(**aggregations).reindex(range(n_bands))
+    bands.insert(0, 'Max distance', edges[1:])
+    bands.insert(0, 'Min distance', edges[:-1])
+
+    center_lines = lines[lines.Center]
+    slice_aggregations = {
+        'Center region first time (s)': ('Time', 'min'),
+        'Center region last time (s)': ('Time', 'max'),
+    }
+    if has_RD:
+        slice_aggregations.update({
+            'Center RD mean (s)': ('RD', 'mean'),
+            'Center RD std (s)': ('RD', 'std'),
+            'Center RD min (s)': ('RD', 'min'),
+            'Center RD max (s)': ('RD', 'max'),
+        })
+    slices = center_lines.groupby('Sli').agg(**slice_aggregations)
+    # the last acquisition of the center line is the one used for reconstruction
+    slices.insert(0, 'Center line time (s)', lines[lines.CenterLine].groupby('Sli').Time.max())
+
+    center_RD = center_lines.RD.dropna().values
+    center = {
+        'Center lines': len(center_lines),
+        'Center acquisition duration (s)': np.ptp(center_lines.Time.values) if len(center_lines) else np.nan,
+    }
+    if len(center_RD):
+        q25, q75 = np.percentile(center_RD, [25, 75])
+        center.update({
+            'RD mean (s)': center_RD.mean(),
+            'RD std (s)': center_RD.std(),
+            'RD interquartile range (s)': q75 - q25,
+            'RD range (s)': np.ptp(center_RD),
+        })
+    return bands.reset_index(), slices.reset_index(), center
@@ -3,8 +3,7 @@
 ############################
 
 import numpy as np
-from scipy.stats import mode
-from scipy.optimize import differential_evolution
+# scipy is imported in the functions that need it to keep the app startup fast
 
 ############################
 # Useful functions
@@ -52,6 +51,7 @@ def get_segments(trigger_times, readout_times):
     raise ValueError("Trigger times are not compatible with readout times. Please check the input data.")
 
 def find_corrupted_shot(delta_triggers, tolerance=0.15, precision=5e-2):
+    from scipy.stats import mode
     delta_triggers_rounded = np.round((delta_triggers / precision)) * precision
 
     # Calculate mode using scipy.stats.mode
@@ -63,6 +63,51 @@ def find_corrupted_shot(delta_triggers, tolerance=0.15, precision=5e-2):
     ])
     return corrupted_shots
 
+def adaptive_resolution(times, Mz, max_points=None, tolerance=1e-4):
+    """Select the samples of a magnetization series needed to plot it with straight lines.
+
+    RF events (inversions, readouts, alpha_b pulses, SPPRESS) are discontinuities and keep their samples on both
+    sides, while smooth exponential recoveries are sampled with a density proportional to the square root of their
+    curvature, which is the optimal repartition for a piecewise linear interpolation.
+    If the series still has more than max_points samples, the time axis is split in max_points//4 buckets
+    and only the first, last, minimum and maximum samples of each bucket are kept, so that the plotted curve is
+    unchanged as long as a bucket is much narrower than a pixel of the figure.
+
+    Args:
+        times (list, np.array): time points in seconds, sorted.
+        Mz (list, np.array): magnetization at each time point.
+        max_points (int, optional): maximum number of samples to keep. Defaults to None.
+        tolerance (float, optional): maximum interpolation error of the magnetization. Defaults to 1e-4.
+
+    Returns:
+        tuple(np.array, np.array): kept time points and magnetizations.
+    """
+    times = np.asarray(times, dtype=float)
+    Mz = np.asarray(Mz, dtype=float)
+    if len(Mz) <= 2:
+        return times, Mz
+    # the error of a linear interpolation over n samples is about n**2 * |second difference| / 8
+    second_difference = np.zeros(len(Mz))
+    second_difference[1:-1] = np.abs(Mz[2:] - 2*Mz[1:-1] + Mz[:-2])
+    levels = np.floor(np.cumsum(np.sqrt(second_difference)) / np.sqrt(8*tolerance))
+    keep = np.concatenate([[True], levels[1:] > levels[:-1]])
+    events = second_difference > 8*tolerance
+    keep[:-1] |= events[1:]
+    keep |= events
+    keep[1:] |= events[:-1]
+    keep[-1] = True
+    times, Mz = times[keep], Mz[keep]
+
+    if max_points is not None and len(Mz) > max_points:
+        n_buckets = max(max_points // 4, 1)
+        buckets = np.minimum(((times - times[0]) / (times[-1] - times[0]) * n_buckets).astype(int), n_buckets-1)
+        order = np.lexsort((Mz, buckets)) # sorted by bucket then by magnetization
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        ends = np.append(starts[1:], len(buckets)) - 1
+        idxs = np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+        times, Mz = times[idxs], Mz[idxs]
+    return times, Mz
+
 def compute_Mzeq_with_SPRESS(TI, T1, delta_trigger, TR, Nseg):
     """Compute the longitudinal equilibirum after a SPPRESS module
 
@@ -81,6 +126,100 @@ def compute_Mzeq_with_SPRESS(TI, T1, delta_trigger, TR, Nseg):
     E1_rec = compute_E1(RD, T1)
     return 1-E1_rec
 
+def solve_affine_recurrence(A, B, M0):
+    """Solve M[k] = A[k]*M[k-1] + B[k] with M[-1] = M0 without a Python loop.
+
+    The solution is M[k] = P[k]*(M0 + sum_{j<=k} B[j]/P[j]) with P the cumulative product of A. The recurrence is
+    restarted where A is 0 (the magnetization is then B, e.g. after a saturation) and solved step by step in the
+    rare case where P underflows.
+
+    Args:
+        A (np.array): multiplicative factors.
+        B (np.array): additive terms.
+        M0 (float): value before the first step.
+
+    Returns:
+        np.array: M.
+    """
+    M = np.empty(len(A))
+    starts = np.concatenate([[0], np.flatnonzero(A == 0), [len(A)]])
+    for start, end in zip(starts[:-1], starts[1:]):
+        if start == end:
+            continue
+        if start > 0:
+            M0 = M[start-1]
+        P = np.cumprod(A[start:end])
+        if np.abs(P[-1]) > 1e-250:
+            M[start:end] = P * (M0 + np.cumsum(B[start:end] / P))
+        else:
+            for k in range(start, end):
+                M0 = M[k] = A[k]*M0 + B[k]
+    return M
+
+def correction_pulse_objective(params, M_corrupted, S_eq, TI, T1s):
+    """Error between the corrected and the expected magnetization at the readout, and its analytic gradient.
+
+    After the inversion, the corrupted magnetization relaxes during TI - t_a, is tipped by the pulse of angle alpha_b
+    and relaxes during t_a. With E(t) = exp(-t/T1) and c = cos(alpha_b), the magnetization at the readout is
+    M = c*(-(M_corrupted+1)*E(TI) + E(t_a)) + 1 - E(t_a).
+
+    Args:
+        params (tuple): duration t_a in seconds between the pulse and the readout and angle alpha_b in radian.
+        M_corrupted (np.array): magnetization before the inversion of the corrupted shot for each T1.
+        S_eq (np.array): magnetization at the readout of an uncorrupted shot for each T1.
+        TI (float): inversion time in seconds.
+        T1s (np.array): T1 relaxation times in seconds.
+
+    Returns:
+        tuple(float, np.array): sum over the T1s of the squared errors and its gradient with respect to params.
+    """
+    t_a, alpha_b = params
+    E_a = compute_E1(t_a, T1s)
+    G = -(M_corrupted + 1) * compute_E1(TI, T1s) + E_a
+    cos_b = np.cos(alpha_b)
+    residuals = cos_b * G + 1 - E_a - S_eq
+    gradient = 2 * np.array([
+        np.sum(residuals * (1 - cos_b) * E_a / T1s),
+        np.sum(residuals * -np.sin(alpha_b) * G),
+    ])
+    return np.sum(residuals**2), gradient
+
+def solve_correction_pulse(M_corrupted, S_eq, TI, T1s, n_grid=64, n_starts=4):
+    """Find the correction pulse minimizing correction_pulse_objective with a grid search refined by L-BFGS-B.
+
+    The magnetization at the readout is linear in cos(alpha_b), so for each t_a of a grid the best angle is given
+    by a least squares fit. The best grid points are then refined with the analytic gradient.
+
+    Args:
+        M_corrupted (np.array): magnetization before the inversion of the corrupted shot for each T1.
+        S_eq (np.array): magnetization at the readout of an uncorrupted shot for each T1.
+        TI (float): inversion time in seconds.
+        T1s (np.array): T1 relaxation times in seconds.
+        n_grid (int, optional): number of t_a values of the grid. Defaults to 64.
+        n_starts (int, optional): number of grid points refined. Defaults to 4.
+
+    Returns:
+        tuple(float, float): duration t_a in seconds and angle alpha_b in radian of the pulse.
+    """
+    from scipy.optimize import minimize
+
+    t_as = np.linspace(0, TI, n_grid)[:, None]
+    E_a = compute_E1(t_as, T1s)
+    G = -(M_corrupted + 1) * compute_E1(TI, T1s) + E_a
+    target = S_eq - 1 + E_a
+    cos_b = np.clip(np.sum(G * target, axis=1) / np.maximum(np.sum(G**2, axis=1), 1e-300), -1, 1)
+    errors = np.sum((cos_b[:, None] * G - target)**2, axis=1)
+    bounds = [(0, TI), (0, np.pi)]
+    best = None
+    for i in np.argsort(errors)[:n_starts]:
+        result = minimize(
+            correction_pulse_objective, x0=[t_as[i, 0], np.arccos(cos_b[i])], args=(M_corrupted, S_eq, TI, T1s),
+            jac=True, method='L-BFGS-B', bounds=bounds,
+        )
+        if best is None or result.fun < best.fun:
+            best = result
+    return tuple(best.x)
+
 
 ############################
 # Main functions
@@ -97,6 +236,7 @@ def find_1_optimal_pulse(
             maxiter=1000,
             precision=5e-2,
             tolerance=0.15,
+            solver='differential_evolution',
         ):
         """Useful method to compute the optimal duration and angle of the optimized pulse to restore magnetization
 
@@ -106,10 +246,15 @@ def find_1_optimal_pulse(
             TR (float, optional): repetition time (sometimes called echo spacing) in seconds. Defaults to None.
             Nseg (int, optional): Number of segments in one shot. Defaults to None.
             maxiter (int, optional) maximum number of repetition performed during the optimization process.
+            solver (str, optional): 'differential_evolution' or 'gradient', a grid search refined with the analytic
+                gradient (see solve_correction_pulse), much faster. Defaults to 'differential_evolution'.
 
         Returns:
             tuple(duration, angle): duration in seconds and angle in radian of the optimized repetition.
         """
+        from scipy.stats import mode
+        from scipy.optimize import differential_evolution
+
         if Nseg is None:
             Nseg = get_segments(trigger_times, readout_times)
         if TR is None:
@@ -125,32 +270,21 @@ def find_1_optimal_pulse(
         all_alpha_b_opt = []
         delta_triggers_corrupted = delta_triggers[np.where(corrupted_shots)[0]-1] # get the delta_trigger of shot before the corrupted shots
         
+        T1s = np.asarray(T1s, dtype=float)
+        Mzeq = compute_Mzeq_with_SPRESS(TI, T1s, delta_trigger_base, TR, Nseg)
+        S_eq = compute_relaxation(-Mzeq, TI, T1s)
         for i, delta_trigger_corrupted in enumerate(delta_triggers_corrupted):
-            # Objective function to minimize
-            def objective(params):
-                t_a, alpha_b = params
-                total_error = 0
-
-                cos_b = np.cos(alpha_b)
-                for T1 in T1s:
-                    Mzeq = compute_Mzeq_with_SPRESS(TI, T1, delta_trigger_base, TR, Nseg)
-                    M_corruped = compute_relaxation(Mzeq, delta_trigger_corrupted-delta_trigger_base, T1)
-                
-                    M = compute_relaxation(-M_corruped, TI-t_a, T1)
-                    M *= cos_b  # apply reduced FA
-                    M = compute_relaxation( M, t_a, T1)
-                
-                    S_corrected = M
-                    S_eq = compute_relaxation(-Mzeq, TI, T1)
-                    
-                    total_error += (S_corrected-S_eq)**2
-                
-                return total_error
-            # Bounds: t_a and t_c must be positive; alpha_b in [0, pi]
-            bounds = [(0, TI), (0, np.pi)]
-
-            result = differential_evolution(objective, bounds=bounds, maxiter=maxiter)
-            t_a_opt, alpha_b_opt = result.x
+            M_corrupted = compute_relaxation(Mzeq, delta_trigger_corrupted-delta_trigger_base, T1s)
+            if solver == 'gradient':
+                t_a_opt, alpha_b_opt = solve_correction_pulse(M_corrupted, S_eq, TI, T1s)
+            elif solver == 'differential_evolution':
+                # Bounds: t_a and t_c must be positive; alpha_b in [0, pi]
+                bounds = [(0, TI), (0, np.pi)]
+                objective = lambda params: correction_pulse_objective(params, M_corrupted, S_eq, TI, T1s)[0]
+                result = differential_evolution(objective, bounds=bounds, maxiter=maxiter)
+                t_a_opt, alpha_b_opt = result.x
+            else:
+                raise ValueError(f"Unknown solver '{solver}'.")
             print(f"A pulse of {t_a_opt*1e3:.2f} ms with a flip angle of {np.rad2deg(alpha_b_opt):.2f}° is used to restore magnetization of shot {i}.")
             all_t_a_opt.append(t_a_opt)
             all_alpha_b_opt.append(np.rad2deg(alpha_b_opt))
@@ -170,23 +304,33 @@ def series_Mz_1FA_SPPRESS(
     alpha_b=0, 
     time_step=1e-3, 
     do_SPPRESS=True, 
-    reordering='Centric'
+    reordering='Centric',
+    preallocate=False,
+    adaptive=False,
+    max_points=None,
+    SPPRESS_duration=0.01750,
 ):
     """Generate a series of longitudinal magnetization.
 
     Args:
-        TI (float): inversion time in seconds.
+        TI (float or np.array): inversion time in seconds, or one inversion time per shot (per trigger).
         T1 (float): T1 relaxation time in seconds.
-        FA (float): flip angle in degrees.
+        FA (float or np.array): flip angle in degrees, or one flip angle per readout, e.g. for ramped flip angles.
         readout_times (list): list of readout times in seconds.
         trigger_times (list): list of trigger times in seconds.
-        corrupted_shots (list, optional): list of corrupted shot indices. Defaults to []. 
-            0 is before the first trigger, 1 is the first shot after the first trigger, etc.
+        corrupted_shots (list, optional): list of corrupted shot indices as returned by find_corrupted_shot,
+            shot k starts at trigger_times[k] and follows an irregular RR. Defaults to [].
         t_a (float, optional): delay of the optimized block pre readout in seconds. Defaults to 0.
         alpha_b (float, optional): alpha_b pulse angle in degrees. Defaults to 0.
         time_step (float, optional): time step in seconds. Defaults to 1e-3.
         do_SPPRESS (bool, optional): whether to do SPPRESS. Defaults to True.
         reordering (str, optional): reordering scheme. Defaults to 'Centric'.
+        preallocate (bool, optional): fill preallocated numpy arrays with exponential segments between RF events
+            instead of stepping the relaxation every time step. The samples are the same. Defaults to False.
+        adaptive (bool, optional): keep only the samples needed to plot the series, see adaptive_resolution.
+            Defaults to False.
+        max_points (int, optional): maximum number of samples of the series when adaptive is True. Defaults to None.
+        SPPRESS_duration (float, optional): duration of the SPPRESS module in seconds. Defaults to 0.0175.
 
     Raises:
         ValueError: if the reordering scheme is invalid.
@@ -195,7 +339,16 @@ def series_Mz_1FA_SPPRESS(
         tuple: (all_times, all_Mz, all_times_center, all_Mz_center) 
         where all_times and all_Mz are the time points and corresponding magnetization values for the whole series, 
         and all_times_center and all_Mz_center are the time points and magnetization values for the center shot.
+        Lists are returned by default and numpy arrays if preallocate or adaptive is True.
     """
+    if preallocate:
+        all_times, all_Mz, all_times_center, all_Mz_center = series_Mz_1FA_SPPRESS_preallocated(
+            TI, T1, FA, readout_times, trigger_times, corrupted_shots=corrupted_shots, t_a=t_a, alpha_b=alpha_b,
+            time_step=time_step, do_SPPRESS=do_SPPRESS, reordering=reordering, SPPRESS_duration=SPPRESS_duration,
+        )
+        if adaptive:
+            all_times, all_Mz = adaptive_resolution(all_times, all_Mz, max_points=max_points)
+        return all_times, all_Mz, all_times_center, all_Mz_center
     all_times = []
     all_Mz = []
     all_times_center = []
@@ -206,7 +359,10 @@ def series_Mz_1FA_SPPRESS(
     readout_times_iter = iter(readout_times)
     current_readout_time = next(readout_times_iter)
     next_trigger_times = np.concatenate([ trigger_times[1:], [readout_times.max()+time_step] ]) # add a trigger time after the last readout time to end the simulation after the last readout
-    min_delta_trigger = get_min_delta_triggers(readout_times, next_trigger_times)
+    min_delta_trigger = get_min_delta_triggers(readout_times, next_trigger_times, SPPRESS_duration)
+    TIs = np.broadcast_to(TI, len(next_trigger_times)) # one TI per shot
+    cos_FAs = np.broadcast_to(np.cos(np.deg2rad(FA)), len(readout_times)) # one flip angle per readout
+    readout_idx = 0
     nb_segments = get_segments(next_trigger_times, readout_times)
     if reordering=='Centric':
         center_shot = 0
@@ -233,11 +389,12 @@ def series_Mz_1FA_SPPRESS(
     for i, next_trigger_time in enumerate(next_trigger_times):
         SPPRESS_not_executed = True
         t_last_RF = t
+        TI = TIs[i]
         Mz = -Mz # inversion pulse
         all_Mz.append(Mz)
         all_times.append(t)
         # relaxation during TI
-        if t_a is not None and alpha_b is not None and i-1 in corrupted_shots: # the first shot is after the first trigger
+        if t_a is not None and alpha_b is not None and i in corrupted_shots: # shot i starts at trigger i
             while t-t_last_RF<TI-current_t_a:
                 Mz = compute_relaxation(Mz, time_step, T1)
                 all_Mz.append(Mz)
@@ -262,9 +419,10 @@ def series_Mz_1FA_SPPRESS(
         seg_number = 0
         while t < next_trigger_time:
             if t>= current_readout_time:
-                Mz = compute_relaxation(Mz, current_readout_time-(t-time_step), T1)*np.cos(np.deg2rad(FA)) # readout at current_readout_time
+                Mz = compute_relaxation(Mz, current_readout_time-(t-time_step), T1)*cos_FAs[readout_idx] # readout at current_readout_time
                 Mz = compute_relaxation(Mz, t-current_readout_time, T1) # relaxation after the readout
                 current_readout_time = next(readout_times_iter, float('inf')) # get the next readout time
+                readout_idx += 1
                 if seg_number==center_shot:
                     all_Mz_center.append(Mz)
                     all_times_center.append(t)
@@ -277,5 +435,161 @@ def series_Mz_1FA_SPPRESS(
             all_Mz.append(Mz)
             all_times.append(t) 
             t+=time_step
-            
-    return all_times, all_Mz, all_times_center, all_Mz_center
\ No newline at end of file
+    
+    if adaptive:
+        all_times, all_Mz = adaptive_resolution(all_times, all_Mz, max_points=max_points)
+        all_times_center, all_Mz_center = np.array(all_times_center), np.array(all_Mz_center)
+    return all_times, all_Mz, all_times_center, all_Mz_center
+
+
+def series_Mz_1FA_SPPRESS_preallocated(
+    TI, 
+    T1, 
+    FA, 
+    readout_times, 
+    trigger_times, 
+    corrupted_shots=[], 
+    t_a=0, 
+    alpha_b=0, 
+    time_step=1e-3, 
+    do_SPPRESS=True, 
+    reordering='Centric',
+    SPPRESS_duration=0.01750,
+):
+    """Same series as series_Mz_1FA_SPPRESS, computed event by event in preallocated arrays.
+
+    The number of samples of each shot is computed first, then the relaxation between two RF events
+    (inversion, alpha_b pulse, readouts, SPPRESS) is filled at once with M_inf + (M0 - M_inf)*exp(-t/T1).
+    Within a shot, each readout maps the magnetization of the previous one to M -> A*M + B, with A the product of
+    cos(FA) and the relaxation factors, so all the readouts of a shot are solved at once whatever their flip angles.
+
+    Returns:
+        tuple: (all_times, all_Mz, all_times_center, all_Mz_center) as numpy arrays.
+    """
+    readout_times = np.asarray(readout_times, dtype=float)
+    next_trigger_times = np.concatenate([ trigger_times[1:], [readout_times.max()+time_step] ])
+    min_delta_trigger = get_min_delta_triggers(readout_times, next_trigger_times, SPPRESS_duration)
+    nb_segments = get_segments(next_trigger_times, readout_times)
+    if reordering=='Centric':
+        center_shot = 0
+    elif reordering=='Linear':
+        center_shot = nb_segments//2
+    else:
+        raise ValueError("Invalid reordering scheme. Choose 'Centric' or 'Linear'.")
+    TIs = np.broadcast_to(TI, len(next_trigger_times)) # one TI per shot
+    corrected = t_a is not None and alpha_b is not None
+    if corrected:
+        if isinstance(t_a, (float, int)):
+            t_a = [t_a]*len(corrupted_shots)
+        if isinstance(alpha_b, (float, int)):
+            alpha_b = [alpha_b]*len(corrupted_shots)
+    corrupted_shots = set(np.asarray(corrupted_shots, dtype=int).tolist())
+    cos_FAs = np.broadcast_to(np.cos(np.deg2rad(FA)), len(readout_times)) # one flip angle per readout
+
+    def shot_grid(t, next_trigger_time, TI):
+        # time steps of a shot, accumulated like t += time_step so that event times match the time-stepping loop
+        n = int(np.ceil(max(TI, next_trigger_time - t) / time_step)) + 3
+        grid = np.full(n, time_step)
+        grid[0] = t
+        grid = np.cumsum(grid)
+        n_TI = np.searchsorted(grid - t, TI)
+        return grid, n_TI, max(n_TI, np.searchsorted(grid, next_trigger_time))
+
+    # Number of samples per shot: one for the inversion and one per time step until the next trigger
+    shot_starts = np.empty(len(next_trigger_times))
+    n_steps = np.empty(len(next_trigger_times), dtype=int)
+    t = trigger_times[0]
+    for i, next_trigger_time in enumerate(next_trigger_times):
+        grid, _, n_steps[i] = shot_grid(t, next_trigger_time, TIs[i])
+        shot_starts[i] = t
+        t = grid[n_steps[i]]
+
+    all_times = np.empty(2 + np.sum(1 + n_steps))
+    all_Mz = np.empty_like(all_times)
+    all_times_center = np.empty(len(next_trigger_times))
+    all_Mz_center = np.empty(len(next_trigger_times))
+    E1s = compute_E1(time_step*np.arange(0, n_steps.max()+1), T1) # relaxation factors after 0, 1, ... time steps
+
+    def relax(p, n, Mz):
+        # fill n samples from index p with the relaxation of Mz, return the last magnetization
+        if n <= 0:
+            return Mz
+        all_Mz[p:p+n] = 1 + (Mz - 1)*E1s[1:n+1]
+        return all_Mz[p+n-1]
+
+    all_times[:2] = 0., trigger_times[0]
+    all_Mz[:2] = 1.
+    p = 2
+    Mz = 1. # M0
+    readout_ptr = 0
+    n_center = 0
+    corrected_count = 0
+    for i, next_trigger_time in enumerate(next_trigger_times):
+        t_last_RF = shot_starts[i]
+        TI = TIs[i]
+        grid, n_TI, n = shot_grid(t_last_RF, next_trigger_time, TI)
+        all_times[p] = t_last_RF
+        all_times[p+1:p+1+n] = grid[:n]
+        Mz = -Mz # inversion pulse
+        all_Mz[p] = Mz
+        q = p + 1 # index of the sample of the first time step
+        # relaxation during TI
+        if corrected and i in corrupted_shots: # shot i starts at trigger i
+            n_a = np.searchsorted(grid - t_last_RF, TI - t_a[min(corrected_count, len(t_a)-1)])
+            Mz = relax(q, n_a, Mz)
+            Mz *= np.cos(np.deg2rad(alpha_b[min(corrected_count, len(alpha_b)-1)])) # alpha_b pulse
+            Mz = relax(q+n_a, n_TI-n_a, Mz)
+            corrected_count += 1
+        else:
+            Mz = relax(q, n_TI, Mz)
+
+        # each readout is executed at the first time step after its time and after the previous readout
+        candidates = readout_times[readout_ptr:readout_ptr+max(n-n_TI, 0)]
+        offsets = np.arange(len(candidates))
+        readout_steps = offsets + np.maximum.accumulate(
+            np.maximum(np.searchsorted(grid, candidates) - offsets, n_TI)
+        ) if len(candidates) else np.empty(0, dtype=int)
+        n_readouts = np.searchsorted(readout_steps, n)
+        steps = readout_steps[:n_readouts]
+        is_readout = np.ones(n_readouts, dtype=bool)
+        if do_SPPRESS:
+            # SPPRESS is executed at the first time step after min_delta_trigger without readout
+            k = max(np.searchsorted(grid - t_last_RF, min_delta_trigger, side='right'), n_TI)
+            j = np.searchsorted(steps, k)
+            while j < n_readouts and steps[j] == k:
+                k, j = k+1, j+1
+            if k < n:
+                steps = np.insert(steps, j, k)
+                is_readout = np.insert(is_readout, j, False)
+        # readout at readout_time after the relaxation from the previous event to the previous time step,
+        # then relaxation until the time step: M -> A*M + B
+        t = grid[steps[is_readout]]
+        readouts = candidates[:n_readouts]
+        cos_FA = cos_FAs[readout_ptr:readout_ptr+n_readouts]
+        readout_ptr += n_readouts
+        previous_steps = np.concatenate([[n_TI-1], steps[:-1]])
+        E_before = E1s[steps[is_readout] - previous_steps[is_readout] - 1] * compute_E1(readouts - (t - time_step), T1)
+        E_after = compute_E1(t - readouts, T1)
+        A = np.zeros(len(steps))
+        B = np.empty(len(steps))
+        A[is_readout] = E_after * cos_FA * E_before
+        B[is_readout] = 1 - E_after + E_after * cos_FA * (1 - E_before)
+        # the magnetization after SPPRESS does not depend on the previous one
+        B[~is_readout] = compute_relaxation(0, grid[steps[~is_readout]]-t_last_RF- min_delta_trigger, T1)
+        event_Mz = solve_affine_recurrence(A, B, Mz)
+        readout_Mz = event_Mz[is_readout]
+        if center_shot < n_readouts:
+            all_Mz_center[n_center] = readout_Mz[center_shot]
+            all_times_center[n_center] = t[center_shot]
+            n_center += 1
+
+        # relaxation from the last event before each time step
+        event_steps = np.concatenate([[n_TI-1], steps])
+        event_Mz = np.concatenate([[Mz], event_Mz])
+        ks = np.arange(n_TI, n)
+        last_event = np.searchsorted(event_steps, ks, side='right') - 1
+        all_Mz[q+n_TI:q+n] = 1 + (event_Mz[last_event] - 1)*E1s[ks - event_steps[last_event]]
+        Mz = all_Mz[q+n-1] if n > n_TI else Mz
+        p = q + n
+
+    return all_times, all_Mz, all_times_center[:n_center], all_Mz_center[:n_center]
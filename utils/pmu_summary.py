@@ -0,0 +1,48 @@
+import numpy as np
+
+class PMUSummary:
+    """ Summary of the PMU data of a twix file, computed once after loading so that the pages do not
+    go through every channel on each rerun.
+
+    Attributes:
+    - keys: All channel names.
+    - ranges: Peak-to-peak amplitude of each channel.
+    - is_active: Whether each channel is a recorded signal (not a learning signal and not flat).
+    - has_trigger: Whether each channel has trigger events.
+    - signals: Signals normalised between 0 and 1, as float32.
+    - times: Time axis of each signal in seconds, starting at 0.
+    - start_timestamps: Raw timestamp of the first sample of each signal, origin of its time axis.
+    - trigger_times: Trigger times of each channel in seconds, on the same time axis as its signal.
+    """
+
+    def __init__(self, pmu):
+        self.keys = list(pmu.signal.keys())
+        self.ranges = {}
+        self.is_active = {}
+        self.has_trigger = {}
+        self.signals = {}
+        self.times = {}
+        self.start_timestamps = {}
+        self.trigger_times = {}
+        for key in self.keys:
+            signal = np.asarray(pmu.signal[key])
+            signal_min, signal_max = (signal.min(), signal.max()) if len(signal) else (0, 0)
+            self.ranges[key] = signal_max - signal_min
+            self.is_active[key] = not key.startswith('LEARN_') and self.ranges[key] > 0
+            self.signals[key] = ((signal - signal_min) / (self.ranges[key] + 1e-8)).astype(np.float32)
+            start_time = pmu.timestamp[key][0]
+            self.start_timestamps[key] = int(start_time)
+            self.times[key] = (pmu.timestamp[key] - start_time) * 2.5e-3  # convert to seconds
+            triggered = np.asarray(pmu.trigger[key]) > 0
+            self.has_trigger[key] = bool(np.any(triggered))
+            self.trigger_times[key] = (pmu.timestamp_trigger[key][triggered] - start_time) * 2.5e-3
+
+    @property
+    def signal_keys(self):
+        """ Channels with a recorded signal, excluding learning signals. """
+        return [key for key in self.keys if self.is_active[key]]
+
+    @property
+    def trigger_keys(self):
+        """ Channels with trigger events, excluding learning signals. """
+        return [key for key in self.keys if not key.startswith('LEARN_') and self.has_trigger[key]]
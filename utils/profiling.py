@@ -0,0 +1,173 @@
+############################
+# Import necessary libraries
+############################
+
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+_local = threading.local()
+# tracemalloc peaks are process-wide, only one run at a time traces its memory
+_tracing_lock = threading.Lock()
+
+############################
+# Useful functions
+############################
+
+def get_peak_memory():
+    """Peak resident memory of the process in MB since it started, None if it cannot be measured.
+    It never decreases, so it only describes the whole server process, not a run or a stage."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macOS, kB on Linux
+
+def get_current_run():
+    return getattr(_local, 'run', None)
+
+def get_figure_payload(fig):
+    """Number of points and bytes of the data arrays of a plotly figure, a cheap estimate of what is sent to the browser."""
+    n_points = 0
+    n_bytes = 0
+    for trace in fig.data:
+        values = [
+            getattr(trace, key) for key in ('x', 'y', 'z', 'customdata')
+            if getattr(trace, key, None) is not None
+        ]
+        marker = getattr(trace, 'marker', None)
+        if marker is not None and marker.color is not None and not isinstance(marker.color, str):
+            values.append(marker.color)
+        for value in values:
+            value = np.asarray(value)
+            n_bytes += value.nbytes
+        if values:
+            n_points += len(values[0])
+    return n_points, n_bytes
+
+
+class RunProfile:
+    """Timings, memory and figure payloads recorded during one script run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self.figures = []
+        self.duration = None
+        self.peak_memory = None
+        self.cprofile_stats = None
+        self.trace_memory = False
+        self._depth = 0
+        self._memory_stack = [] # traced memory at the start of each open span and highest traced memory since
+
+    def to_dict(self):
+        return {
+            'run': self.name,
+            'timestamp': time.time(),
+            'duration_ms': self.duration,
+            'process_peak_rss_mb': self.peak_memory,
+            'spans': self.spans,
+            'figures': self.figures,
+        }
+
+
+############################
+# Main functions
+############################
+
+@contextmanager
+def profile_run(name, log_path=None, cprofile=False, trace_memory=False):
+    """Record the spans and figures of one run of the app in the current thread.
+
+    Spans always record their duration and the increase of the process peak RSS, which are cheap enough to leave on.
+
+    Args:
+        name (str): name of the run, e.g. the selected page.
+        log_path (str, optional): JSON lines file where the run is appended. Defaults to None.
+        cprofile (bool, optional): capture a cProfile of the whole run. Defaults to False.
+        trace_memory (bool, optional): also record the peak memory allocated by each span with tracemalloc, which
+            slows down allocation-heavy code several times. Ignored while another run traces its memory.
+            Defaults to False.
+
+    Yields:
+        RunProfile: the profile of the run, complete once the context exits.
+    """
+    run = RunProfile(name)
+    _local.run = run
+    run.trace_memory = trace_memory and not tracemalloc.is_tracing() and _tracing_lock.acquire(blocking=False)
+    if run.trace_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if cprofile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield run
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            with io.StringIO() as buffer:
+                pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(40)
+                run.cprofile_stats = buffer.getvalue()
+        run.duration = 1e3 * (time.perf_counter() - start)
+        run.peak_memory = get_peak_memory()
+        if run.trace_memory:
+            tracemalloc.stop()
+            _tracing_lock.release()
+        _local.run = None
+        if log_path:
+            with open(log_path, 'a') as f:
+                f.write(json.dumps(run.to_dict()) + '\n')
+
+@contextmanager
+def span(name):
+    """Time a stage of the current run. Does nothing outside of profile_run."""
+    run = get_current_run()
+    if run is None:
+        yield
+        return
+    record = {'name': name, 'depth': run._depth}
+    run.spans.append(record)
+    run._depth += 1
+    start_rss = get_peak_memory()
+    if run.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if run._memory_stack:
+            run._memory_stack[-1][1] = max(run._memory_stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        run._memory_stack.append([current, current])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['duration_ms'] = 1e3 * (time.perf_counter() - start)
+        # new process peak reached during the span, 0 if the span stayed below an earlier peak
+        record['peak_rss_increase_mb'] = get_peak_memory() - start_rss if start_rss is not None else None
+        if run.trace_memory:
+            # peak allocated by the span above what was allocated when it started
+            start_memory, span_peak = run._memory_stack.pop()
+            span_peak = max(span_peak, tracemalloc.get_traced_memory()[1])
+            record['peak_allocated_mb'] = (span_peak - start_memory) / 2**20
+            if run._memory_stack:
+                run._memory_stack[-1][1] = max(run._memory_stack[-1][1], span_peak)
+        run._depth -= 1
+
+def record_figure(name, fig):
+    """Record the payload of a figure sent to the browser during the current run."""
+    run = get_current_run()
+    if run is None:
+        return
+    n_points, n_bytes = get_figure_payload(fig)
+    run.figures.append({'name': name, 'traces': len(fig.data), 'points': n_points, 'array_bytes': n_bytes})
@@ -0,0 +1,211 @@
+############################
+# Import necessary libraries
+############################
+
+import hashlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.optimized_pulse import series_Mz_1FA_SPPRESS, find_corrupted_shot, find_1_optimal_pulse
+from utils.twix_dataframe import ShotIndex
+
+CORRECTION_METHODS = ['None', 'One optimized pulse', 'Dummy scan']
+
+############################
+# Useful functions
+############################
+
+def shift_triggers_to_inversion(trigger_times, readout_times, TI):
+    """Shift the trigger times so that they match the inversion pulses.
+
+    Args:
+        trigger_times (np.array): trigger times in seconds.
+        readout_times (np.array): readout times in seconds.
+        TI (float): inversion time in seconds.
+
+    Returns:
+        np.array: inversion times in seconds.
+    """
+    trigger_to_first_readout = ShotIndex(trigger_times, readout_times[:1]).time_since_trigger[0]
+    return trigger_times + trigger_to_first_readout - TI
+
+def get_data_key(trigger_times, readout_times):
+    """Hash of the timings, used to cache results per scan."""
+    digest = hashlib.sha1(np.asarray(trigger_times, dtype=float).tobytes())
+    digest.update(np.asarray(readout_times, dtype=float).tobytes())
+    return digest.hexdigest()
+
+def compute_center_metrics(Mz_center, shot_ids, corrupted_shots, correction_method, tolerance=0.05):
+    """Reduce the center-shot magnetizations of a simulation to summary metrics.
+
+    Args:
+        Mz_center (np.array): magnetization of the center readout of each shot with readouts.
+        shot_ids (np.array): shot of each center readout, i.e. index of the last inversion before it.
+        corrupted_shots (np.array): indices of the corrupted shots as returned by find_corrupted_shot, the shot
+            following an irregular RR.
+        correction_method (str): correction method used for the simulation.
+        tolerance (float, optional): relative deviation from the steady-state center magnetization
+            below which a corrupted shot is considered corrected. Defaults to 0.05.
+
+    Returns:
+        dict: center-shot Mz mean and variance, and fraction of corrupted shots corrected.
+    """
+    Mz_center = np.asarray(Mz_center)
+    corrupted = np.isin(shot_ids, corrupted_shots)
+    dummy = np.zeros(len(Mz_center), dtype=bool)
+    dummy[:1] = True # the first shot with readouts is a dummy shot
+    Mz_ref = np.median(Mz_center[~(corrupted | dummy)]) if np.any(~(corrupted | dummy)) else np.nan
+    if correction_method == 'Dummy scan':
+        # corrupted shots are replaced by dummy shots and are not used for imaging
+        Mz_used = Mz_center[~(corrupted | dummy)]
+        corrected_fraction = np.nan
+    else:
+        Mz_used = Mz_center[~dummy]
+        deviations = np.abs(Mz_center[corrupted & ~dummy] - Mz_ref)
+        corrected_fraction = np.mean(deviations <= tolerance*np.abs(Mz_ref)) if len(deviations) else np.nan
+    return {
+        'Mz center mean': np.mean(Mz_used) if len(Mz_used) else np.nan,
+        'Mz center variance': np.var(Mz_used) if len(Mz_used) else np.nan,
+        'Corrected fraction': corrected_fraction,
+    }
+
+def simulate_configuration(config):
+    """Run one simulation of a sweep. Defined at module level so that it can be sent to worker processes.
+
+    Args:
+        config (dict): keyword arguments of series_Mz_1FA_SPPRESS together with 'correction_method'.
+
+    Returns:
+        dict: summary metrics of the simulation.
+    """
+    config = dict(config)
+    correction_method = config.pop('correction_method')
+    _, _, all_times_center, all_Mz_center = series_Mz_1FA_SPPRESS(**config, preallocate=True)
+    shot_ids = np.searchsorted(config['trigger_times'], all_times_center) - 1
+    return compute_center_metrics(all_Mz_center, shot_ids, config['corrupted_shots'], correction_method)
+
+def simulate_series(config):
+    """Run series_Mz_1FA_SPPRESS in a worker process.
+
+    Args:
+        config (dict): keyword arguments of series_Mz_1FA_SPPRESS.
+
+    Returns:
+        tuple: (all_times, all_Mz, all_times_center, all_Mz_center) as numpy arrays.
+    """
+    return series_Mz_1FA_SPPRESS(**config, preallocate=True)
+
+def optimize_pulse(args):
+    trigger_times, readout_times, TI, solver = args
+    return find_1_optimal_pulse(trigger_times, readout_times, TI, solver=solver)
+
+
+############################
+# Main functions
+############################
+
+def run_sweep(
+    trigger_times,
+    readout_times,
+    TIs,
+    FAs,
+    T1s,
+    correction_methods=CORRECTION_METHODS,
+    reordering='Centric',
+    do_SPPRESS=True,
+    max_workers=None,
+    cache=None,
+    solver='gradient',
+):
+    """Simulate every combination of TI, flip angle, correction method and T1 and rank the configurations
+    by the stability of the center-shot magnetization.
+
+    Args:
+        trigger_times (np.array): trigger times in seconds (not shifted to the inversion pulses).
+        readout_times (np.array): readout times in seconds.
+        TIs (list): inversion times in seconds.
+        FAs (list): flip angles in degrees.
+        T1s (list): T1 relaxation times in seconds.
+        correction_methods (list, optional): correction methods among CORRECTION_METHODS. Defaults to all of them.
+        reordering (str, optional): reordering scheme. Defaults to 'Centric'.
+        do_SPPRESS (bool, optional): whether to do SPPRESS. Defaults to True.
+        max_workers (int, optional): number of worker processes, 1 runs the sweep in the current process.
+            Defaults to the number of CPUs.
+        cache (dict, optional): results of previous sweeps per configuration, updated in place. Defaults to None.
+        solver (str, optional): solver of the optimized pulses, see find_1_optimal_pulse. Defaults to 'gradient'.
+
+    Returns:
+        tuple(pd.DataFrame, pd.DataFrame): metrics of each configuration and T1,
+            and metrics aggregated over the T1 grid sorted from the most to the least stable configuration.
+    """
+    trigger_times = np.asarray(trigger_times, dtype=float)
+    readout_times = np.asarray(readout_times, dtype=float)
+    if cache is None:
+        cache = {}
+    data_key = get_data_key(trigger_times, readout_times)
+    corrupted_shots = np.where(find_corrupted_shot(np.diff(trigger_times), tolerance=0.15, precision=5e-2))[0]
+    inversion_times = {TI: shift_triggers_to_inversion(trigger_times, readout_times, TI) for TI in TIs}
+
+    configurations = [
+        (TI, FA, correction_method, T1)
+        for TI, FA, correction_method, T1 in itertools.product(TIs, FAs, correction_methods, T1s)
+    ]
+    keys = {
+        configuration: (data_key, reordering, do_SPPRESS, solver) + configuration
+        for configuration in configurations
+    }
+    missing = [configuration for configuration in configurations if keys[configuration] not in cache]
+
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers != 1 else None
+    map_fn = executor.map if executor is not None else map
+    try:
+        # the optimized pulses only depend on TI
+        pulse_TIs = sorted({TI for TI, _, method, _ in missing if method == 'One optimized pulse'})
+        pulses = {
+            TI: cache.get((data_key, 'pulse', solver, TI))
+            for TI in pulse_TIs
+        }
+        TIs_to_optimize = [TI for TI, pulse in pulses.items() if pulse is None]
+        for TI, pulse in zip(TIs_to_optimize, map_fn(
+            optimize_pulse, [(inversion_times[TI], readout_times, TI, solver) for TI in TIs_to_optimize]
+        )):
+            pulses[TI] = cache[(data_key, 'pulse', solver, TI)] = pulse
+
+        configs = []
+        for TI, FA, correction_method, T1 in missing:
+            if correction_method == 'One optimized pulse' and len(corrupted_shots):
+                t_a, alpha_b = pulses[TI]
+            else:
+                t_a, alpha_b = None, None
+            configs.append(dict(
+                TI=TI,
+                T1=T1,
+                FA=FA,
+                readout_times=readout_times,
+                trigger_times=inversion_times[TI],
+                corrupted_shots=corrupted_shots,
+                t_a=t_a,
+                alpha_b=alpha_b,
+                do_SPPRESS=do_SPPRESS,
+                reordering=reordering,
+                correction_method=correction_method,
+            ))
+        for configuration, metrics in zip(missing, map_fn(simulate_configuration, configs)):
+            cache[keys[configuration]] = metrics
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    df = pd.DataFrame([
+        dict(TI=TI, FA=FA, Correction=correction_method, T1=T1, **cache[keys[(TI, FA, correction_method, T1)]])
+        for TI, FA, correction_method, T1 in configurations
+    ])
+    df_summary = df.groupby(['TI', 'FA', 'Correction'], as_index=False).agg(**{
+        'Mz center variance': ('Mz center variance', 'mean'),
+        'Max Mz center variance': ('Mz center variance', 'max'),
+        'Corrected fraction': ('Corrected fraction', 'min'),
+    }).sort_values('Mz center variance', ignore_index=True)
+    return df, df_summary
@@ -0,0 +1,176 @@
+############################
+# Import necessary libraries
+############################
+
+import numpy as np
+# scipy is imported in the functions that need it to keep the app startup fast
+
+# Band-pass (Hz), refractory period (s), adaptive threshold window (s) and relative threshold per channel type
+DETECTION_PARAMETERS = {
+    'ECG': dict(band=(5., 20.), refractory=0.25, window=2., threshold=0.3),
+    'PULS': dict(band=(0.5, 8.), refractory=0.3, window=2., threshold=0.5),
+    'RESP': dict(band=(0.05, 1.), refractory=1.5, window=10., threshold=0.5),
+}
+DETECTED_SUFFIX = '_DETECTED'
+
+############################
+# Useful functions
+############################
+
+def get_channel_type(key):
+    for channel_type in DETECTION_PARAMETERS:
+        if key.startswith(channel_type):
+            return channel_type
+    raise ValueError(f"No trigger detection available for channel '{key}'.")
+
+def get_sampling_rate(timestamps):
+    """Sampling rate in Hz of PMU timestamps in ticks of 2.5 ms."""
+    return 1 / (np.median(np.diff(timestamps)) * 2.5e-3)
+
+def bandpass(signal, fs, low, high, order=2):
+    """Zero-phase Butterworth band-pass filter."""
+    from scipy.signal import butter, sosfiltfilt
+    sos = butter(order, [low, min(high, 0.45*fs)], btype='bandpass', fs=fs, output='sos')
+    return sosfiltfilt(sos, signal)
+
+def adaptive_peaks(feature, fs, refractory, window, threshold):
+    """Peaks of a feature above a fraction of its local envelope, at least refractory seconds apart."""
+    from scipy.ndimage import maximum_filter1d, minimum_filter1d
+    from scipy.signal import find_peaks
+    size = max(int(window*fs), 1)
+    local_max = maximum_filter1d(feature, size)
+    local_min = minimum_filter1d(feature, size)
+    height = local_min + threshold*(local_max - local_min)
+    peaks, _ = find_peaks(feature, height=height, distance=max(int(refractory*fs), 1))
+    return peaks
+
+############################
+# Main functions
+############################
+
+def detect_r_peaks(signal, fs, band=(5., 20.), refractory=0.25, window=2., threshold=0.3):
+    """Detect the R peaks of an ECG signal (Pan-Tompkins like).
+
+    The signal is band-passed on the QRS band, its squared derivative is integrated over 150 ms and peaks
+    above a fraction of the local maximum are kept. Each peak is then moved to the maximum of the filtered
+    signal within one integration window, so that the polarity of the lead does not matter.
+
+    Args:
+        signal (np.array): ECG samples.
+        fs (float): sampling rate in Hz.
+        band (tuple, optional): band-pass in Hz. Defaults to (5., 20.).
+        refractory (float, optional): minimal duration between two R peaks in seconds. Defaults to 0.25.
+        window (float, optional): duration of the adaptive threshold window in seconds. Defaults to 2.
+        threshold (float, optional): threshold relative to the local envelope of the feature. Defaults to 0.3.
+
+    Returns:
+        np.array: sample indices of the R peaks.
+    """
+    filtered = bandpass(np.asarray(signal, dtype=float), fs, *band)
+    integration = max(int(0.15*fs), 1)
+    feature = np.convolve(np.gradient(filtered)**2, np.ones(integration)/integration, mode='same')
+    peaks = adaptive_peaks(feature, fs, refractory, window, threshold)
+    # refine on the filtered signal around each peak of the integrated feature
+    padded = np.pad(np.abs(filtered), (integration, integration), mode='edge')
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2*integration+1)
+    peaks = peaks - integration + np.argmax(windows[peaks], axis=1)
+    return np.unique(np.clip(peaks, 0, len(filtered)-1))
+
+def detect_pulse_peaks(signal, fs, band=(0.5, 8.), refractory=0.3, window=2., threshold=0.5):
+    """Detect the systolic peaks of a pulse (or respiratory) signal.
+
+    Args:
+        signal (np.array): pulse samples.
+        fs (float): sampling rate in Hz.
+        band (tuple, optional): band-pass in Hz. Defaults to (0.5, 8.).
+        refractory (float, optional): minimal duration between two peaks in seconds. Defaults to 0.3.
+        window (float, optional): duration of the adaptive threshold window in seconds. Defaults to 2.
+        threshold (float, optional): threshold relative to the local range of the signal. Defaults to 0.5.
+
+    Returns:
+        np.array: sample indices of the peaks.
+    """
+    filtered = bandpass(np.asarray(signal, dtype=float), fs, *band)
+    return adaptive_peaks(filtered, fs, refractory, window, threshold)
+
+def detect_triggers(pmu, key):
+    """Detect triggers from the waveform of a PMU channel.
+
+    Args:
+        pmu: PMU data of the twix file.
+        key (str): channel name, starting with 'ECG', 'PULS' or 'RESP'.
+
+    Returns:
+        np.array: trigger flags aligned with pmu.timestamp[key], 1 at each detected trigger.
+    """
+    parameters = DETECTION_PARAMETERS[get_channel_type(key)]
+    fs = get_sampling_rate(pmu.timestamp[key])
+    detector = detect_r_peaks if key.startswith('ECG') else detect_pulse_peaks
+    peaks = detector(pmu.signal[key], fs, **parameters)
+    trigger = np.zeros(len(pmu.timestamp[key]), dtype=int)
+    trigger[peaks] = 1
+    return trigger
+
+def add_detected_triggers(pmu, key):
+    """Add a channel '<key>_DETECTED' with the same signal as key and the detected triggers, so that it can be used
+    as trigger method by get_trigger_timing and build_line_dataframe like the triggers recorded by the scanner.
+
+    Returns:
+        str: name of the new channel.
+    """
+    detected_key = key + DETECTED_SUFFIX
+    pmu.signal[detected_key] = pmu.signal[key]
+    pmu.timestamp[detected_key] = pmu.timestamp[key]
+    pmu.timestamp_trigger[detected_key] = pmu.timestamp[key]
+    pmu.trigger[detected_key] = detect_triggers(pmu, key)
+    return detected_key
+
+def compare_triggers(reference_times, detected_times, tolerance=0.15):
+    """Agreement between two sets of trigger times.
+
+    Reference and detected triggers closer than tolerance are matched one-to-one, closest pairs first,
+    so that Matched + Missed = Reference triggers and Matched + Extra = Detected triggers. Missed reference
+    triggers within tolerance of a detected trigger matched to another reference trigger are also counted
+    as double triggers of the reference.
+
+    Args:
+        reference_times (np.array): sorted reference trigger times in seconds, e.g. recorded by the scanner.
+        detected_times (np.array): sorted detected trigger times in seconds.
+        tolerance (float, optional): maximal time difference of matched triggers in seconds. Defaults to 0.15.
+
+    Returns:
+        dict: number of matched, missed, double and extra triggers, sensitivity, positive predictive value
+            and mean and standard deviation of the delay of matched detected triggers in seconds.
+    """
+    reference_times = np.asarray(reference_times, dtype=float)
+    detected_times = np.asarray(detected_times, dtype=float)
+    # Candidate pairs closer than tolerance
+    starts = np.searchsorted(detected_times, reference_times - tolerance, side='left')
+    stops = np.searchsorted(detected_times, reference_times + tolerance, side='right')
+    counts = stops - starts
+    reference_idxs = np.repeat(np.arange(len(reference_times)), counts)
+    detected_idxs = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    pair_delays = detected_times[detected_idxs] - reference_times[reference_idxs]
+    # Greedy one-to-one matching, closest pairs first
+    reference_matched = np.zeros(len(reference_times), dtype=bool)
+    detected_matched = np.zeros(len(detected_times), dtype=bool)
+    delays = []
+    for k in np.argsort(np.abs(pair_delays), kind='stable'):
+        i, j = reference_idxs[k], detected_idxs[k]
+        if not reference_matched[i] and not detected_matched[j]:
+            reference_matched[i] = detected_matched[j] = True
+            delays.append(pair_delays[k])
+    n_matched = len(delays)
+    n_double = len(np.unique(reference_idxs[~reference_matched[reference_idxs]]))
+    return {
+        'Reference triggers': len(reference_times),
+        'Detected triggers': len(detected_times),
+        'Matched': n_matched,
+        'Missed': len(reference_times) - n_matched,
+        'Double': n_double,
+        'Extra': len(detected_times) - n_matched,
+        'Sensitivity': n_matched / len(reference_times) if len(reference_times) else np.nan,
+        'Positive predictive value': n_matched / len(detected_times) if len(detected_times) else np.nan,
+        'Mean delay (s)': np.mean(delays) if n_matched else np.nan,
+        'Delay std (s)': np.std(delays) if n_matched else np.nan,
+    }
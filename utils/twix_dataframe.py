@@ -1,23 +1,151 @@
 import numpy as np
 import pandas as pd
 
-import plotly.graph_objs as go
+class ShotIndex:
+    """ Assignment of each readout to the shot (trigger interval) it was acquired in.
 
-def build_line_dataframe(twix, trigger_method='ECG1', include_patrefscan=True):
-    """ Build a DataFrame containing line, partition, slice, time, flags, and recovery duration (if available)
-    from the given twix data structure.
+    Shot k starts at trigger k, so readouts acquired before the first trigger get the shot id -1.
+    The previous RR of a readout is the duration between the trigger of its shot and the trigger before;
+    readouts without a complete preceding RR (shot id < 1) are masked and hold NaN.
+    New readouts and triggers can be appended without recomputing the whole index.
+    """
+
+    def __init__(self, trigger_times, readout_times=()):
+        self.trigger_times = np.asarray(trigger_times, dtype=float)
+        self.readout_times = np.empty(0)
+        self.shot_ids = np.empty(0, dtype=int)
+        self.previous_RR = np.empty(0)
+        self.time_since_trigger = np.empty(0)
+        self.append_readouts(readout_times)
+
+    @property
+    def RRs(self):
+        """ Durations between consecutive triggers in seconds. """
+        return np.diff(self.trigger_times)
+
+    @property
+    def valid(self):
+        """ Mask of the readouts with a valid preceding RR. """
+        return self.shot_ids >= 1
+
+    def _assign(self, readout_times):
+        shot_ids = np.searchsorted(self.trigger_times, readout_times) - 1 # last trigger strictly before the readout
+        previous_RR = np.full(len(readout_times), np.nan)
+        time_since_trigger = np.full(len(readout_times), np.nan)
+        triggered = shot_ids >= 0
+        time_since_trigger[triggered] = readout_times[triggered] - self.trigger_times[shot_ids[triggered]]
+        valid = shot_ids >= 1
+        previous_RR[valid] = self.RRs[shot_ids[valid]-1]
+        return shot_ids, previous_RR, time_since_trigger
+
+    def append_readouts(self, readout_times):
+        """ Assign new readouts to their shots.
+
+        Parameters:
+        - readout_times: Times of the new readouts in seconds.
+        """
+        readout_times = np.asarray(readout_times, dtype=float)
+        shot_ids, previous_RR, time_since_trigger = self._assign(readout_times)
+        self.readout_times = np.concatenate([self.readout_times, readout_times])
+        self.shot_ids = np.concatenate([self.shot_ids, shot_ids])
+        self.previous_RR = np.concatenate([self.previous_RR, previous_RR])
+        self.time_since_trigger = np.concatenate([self.time_since_trigger, time_since_trigger])
+
+    def append_triggers(self, trigger_times):
+        """ Add new triggers after the last known one and update only the readouts acquired after them.
+
+        Parameters:
+        - trigger_times: Times of the new triggers in seconds, sorted.
+        """
+        trigger_times = np.asarray(trigger_times, dtype=float)
+        if len(trigger_times) == 0:
+            return
+        if len(self.trigger_times) and trigger_times[0] <= self.trigger_times[-1]:
+            raise ValueError("New triggers must come after the last known trigger.")
+        self.trigger_times = np.concatenate([self.trigger_times, trigger_times])
+        stale = np.flatnonzero(self.readout_times > trigger_times[0])
+        if len(stale):
+            self.shot_ids[stale], self.previous_RR[stale], self.time_since_trigger[stale] = \
+                self._assign(self.readout_times[stale])
+
+
+def has_triggers(twix, trigger_method):
+    return 'pmu' in twix and trigger_method in twix['pmu'].trigger and np.any(twix['pmu'].trigger[trigger_method])
+
+
+def get_shot_index(twix, readout_times, trigger_method='ECG1', cache=None):
+    """
+    Get the shot index of the readouts for a trigger method.
+
+    Parameters:
+    - twix: The twix data structure.
+    - readout_times: Readout times in seconds relative to the first trigger.
+    - trigger_method: The method used to trigger the acquisition.
+    - cache: Optional dictionary of shot indexes per trigger method, reused and extended with new readouts.
+
+    Returns:
+    - A ShotIndex, or None if the trigger method has no triggers.
+    """
+    if not has_triggers(twix, trigger_method):
+        return None
+    if cache is not None and trigger_method in cache:
+        shot_index = cache[trigger_method]
+        if len(readout_times) > len(shot_index.readout_times):
+            shot_index.append_readouts(readout_times[len(shot_index.readout_times):])
+        return shot_index
+    shot_index = ShotIndex(get_trigger_timing(twix, trigger_method), readout_times)
+    if cache is not None:
+        cache[trigger_method] = shot_index
+    return shot_index
+
+
+def assign_shots(df, shot_index):
+    """ Add the 'Shot', 'TimeSinceTrigger' and 'RD' (Recovery Duration) columns of a shot index to a line DataFrame.
+    RD is NaN for readouts without a valid preceding RR. The columns are dropped if shot_index is None.
+    """
+    df = df.drop(columns=['Shot', 'TimeSinceTrigger', 'RD'], errors='ignore')
+    if shot_index is None:
+        return df
+    df['Shot'] = shot_index.shot_ids[:len(df)]
+    df['TimeSinceTrigger'] = shot_index.time_since_trigger[:len(df)]
+    df['RD'] = np.round(shot_index.previous_RR[:len(df)], 2)
+    return df
+
+
+def get_start_time(twix, trigger_method='ECG1'):
+    """ Raw timestamp used as time origin: the first trigger timestamp if the trigger method has triggers,
+    otherwise the timestamp of the first MDH.
+    """
+    if has_triggers(twix, trigger_method):
+        return twix['pmu'].timestamp_trigger[trigger_method][0]
+    return twix['mdb'][0].mdh.TimeStamp
+
+
+def update_trigger_method(df, twix, trigger_method='ECG1', shot_index_cache=None):
+    """ Switch a DataFrame built by build_line_dataframe to another trigger method without reading the MDHs again.
+    Times are shifted to the new time origin and the shot columns come from the (cached) shot index.
+    """
+    start_time = get_start_time(twix, trigger_method)
+    df = df.copy()
+    df['Time'] = df['Time'] + (int(df.attrs['start_time']) - int(start_time)) * 2.5e-3
+    df.attrs['start_time'] = start_time
+    shot_index = get_shot_index(twix, df['Time'].values, trigger_method, cache=shot_index_cache)
+    return assign_shots(df, shot_index)
+
+
+def build_line_dataframe(twix, trigger_method='ECG1', include_patrefscan=True, shot_index_cache=None):
+    """ Build a DataFrame containing line, partition, slice, repetition, average, echo, set, phase, segment,
+    time, flags, and recovery duration (if available) from the given twix data structure.
     Parameters:
     - twix: The twix data structure containing the raw data and PMU information.
     - trigger_method: The method used to trigger the acquisition (default is 'ECG1').
     - include_patrefscan: Whether to include PATREFSCAN scans in the DataFrame (default is True).
+    - shot_index_cache: Optional dictionary where the shot index of each trigger method is stored.
     Returns:
-    - A pandas DataFrame with columns: 'Lin', 'Par', 'Sli', 'Time', 'Flags', and optionally 'RD' (Recovery Duration).
+    - A pandas DataFrame with columns: 'Lin', 'Par', 'Sli', 'Rep', 'Ave', 'Eco', 'Set', 'Phs', 'Seg', 'Time',
+    'Flags', and optionally 'Shot', 'TimeSinceTrigger' and 'RD' (Recovery Duration).
     """
-    # if PMU data is available and the specified trigger method has triggers, use the first trigger timestamp as the start time
-    if 'pmu' in twix and any(twix['pmu'].trigger[trigger_method]):
-        start_time = twix['pmu'].timestamp_trigger[trigger_method][0]
-    else:
-        start_time = twix['mdb'][0].mdh.TimeStamp
+    start_time = get_start_time(twix, trigger_method)
     mdbs = [mdb for mdb in twix['mdb'] if mdb.is_image_scan()]
     if include_patrefscan:
         mdbs += [mdb for mdb in twix['mdb'] if not mdb.is_image_scan() and mdb.is_flag_set('PATREFSCAN')]
@@ -29,17 +157,41 @@ def build_line_dataframe(twix, trigger_method='ECG1', include_patrefscan=True):
         'Lin': [mdb.cLin for mdb in mdbs],
         'Par': [mdb.cPar for mdb in mdbs],
         'Sli': [mdb.cSlc for mdb in mdbs],
+        'Rep': [mdb.cRep for mdb in mdbs],
+        'Ave': [mdb.cAve for mdb in mdbs],
+        'Eco': [mdb.cEco for mdb in mdbs],
+        'Set': [mdb.cSet for mdb in mdbs],
+        'Phs': [mdb.cPhs for mdb in mdbs],
+        'Seg': [mdb.cSeg for mdb in mdbs],
         'Flags': [' '.join(f for f in mdb.get_active_flags()) for mdb in mdbs],
     })
+    df.attrs['start_time'] = start_time
     
     # Add recovery durations if available
-    if 'pmu' in twix and any(twix['pmu'].trigger[trigger_method]):
-        trigger_timing = get_trigger_timing(twix, trigger_method)
-        idxs_sorted = np.searchsorted(trigger_timing, timestamps)
-        RDs = np.diff(trigger_timing)[idxs_sorted-2] # last trigger - previous trigger
-        df['RD'] =  np.round(RDs, 2)
-    
-    return df
+    shot_index = get_shot_index(twix, timestamps, trigger_method, cache=shot_index_cache)
+    return assign_shots(df, shot_index)
+
+
+def get_navigator_timestamps(twix):
+    """ Sorted raw timestamps of the navigator (RTFEEDBACK) readouts, independent of the time origin. """
+    return np.sort(np.array([mdb.mdh.TimeStamp for mdb in twix['mdb'] if mdb.is_flag_set('RTFEEDBACK')], dtype=np.int64))
+
+
+def get_navigator_times(twix, start_time, timestamps=None):
+    """
+    Get the times of the navigator (RTFEEDBACK) readouts.
+
+    Parameters:
+    - twix: The twix data structure.
+    - start_time: Raw timestamp used as time origin, e.g. df.attrs['start_time'] of the line DataFrame.
+    - timestamps: Optional raw timestamps returned by get_navigator_timestamps, to avoid going through the MDHs again.
+
+    Returns:
+    - Sorted array of navigator times in seconds.
+    """
+    if timestamps is None:
+        timestamps = get_navigator_timestamps(twix)
+    return (timestamps - int(start_time)) * 2.5e-3 # convert to seconds
 
 
 def get_trigger_timing(twix, trigger_method='ECG1'):
@@ -61,4 +213,4 @@ def get_trigger_timing(twix, trigger_method='ECG1'):
     trigger_timing = pmu.timestamp_trigger[trigger_method][mask]
     trigger_timing = (trigger_timing - start_time)  * 2.5e-3 # convert to seconds
 
-    return trigger_timing
\ No newline at end of file
+    return trigger_timing